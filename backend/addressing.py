@@ -0,0 +1,76 @@
+import threading
+
+import numpy as np
+
+
+
+#########################################################################################################################################################################################
+# Integer cell addressing: the pipeline carries 0-based (row, col) indices, Excel labels are looked up only when text is written
+#########################################################################################################################################################################################
+
+def column_index_to_label(index):
+    """
+    Converts a numeric column index (0-based) to an Excel-style column label.
+    For example, 0 -> 'A', 25 -> 'Z', 26 -> 'AA'.
+    """
+    label = ""
+    while index >= 0:
+        label = chr(index % 26 + ord('A')) + label
+        index = index // 26 - 1
+    return label
+
+
+# Labels of the columns generated so far, index -> label; grown by column_labels
+_COLUMN_LABELS = []
+_COLUMN_LABELS_LOCK = threading.Lock()
+
+
+def column_labels(count):
+    """
+    Lookup table of Excel column labels covering at least the first count columns:
+    column_labels(n)[index] == column_index_to_label(index). The table is shared by the process and only
+    grows, so every label is generated once; each label extends the label of index // 26 - 1 by one letter.
+
+    :return: List of labels (do not modify)
+    """
+    if len(_COLUMN_LABELS) < count:
+        with _COLUMN_LABELS_LOCK:
+            for index in range(len(_COLUMN_LABELS), count):
+                prefix = _COLUMN_LABELS[index // 26 - 1] if index >= 26 else ""
+                _COLUMN_LABELS.append(prefix + chr(index % 26 + ord('A')))
+    return _COLUMN_LABELS
+
+
+def as_cells(grid_cells):
+    """
+    :param grid_cells: (M, 4) array or iterable of 0-based (row, col, adjacent_row, adjacent_col)
+    :return: (M, 4) int64 array
+    """
+    return np.asarray(grid_cells, dtype=np.int64).reshape(-1, 4)
+
+
+def cells_to_ranges(grid_cells):
+    """
+    Merged ranges of the panels' cells.
+
+    :param grid_cells: (M, 4) array of 0-based (row, col, adjacent_row, adjacent_col)
+    :return: (M, 4) int array of (first_row, first_column, last_row, last_column), 1-based like Excel
+    """
+    cells = as_cells(grid_cells)
+    first = np.minimum(cells[:, :2], cells[:, 2:])
+    last = np.maximum(cells[:, :2], cells[:, 2:])
+    return np.hstack((first, last)) + 1
+
+
+def range_references(ranges):
+    """
+    Excel references of merged ranges, e.g. "I81:J81".
+
+    :param ranges: (M, 4) array from cells_to_ranges
+    :return: List of M strings
+    """
+    labels = column_labels(int(ranges[:, 3].max()) if len(ranges) else 0)
+    return [
+        f"{labels[first_col - 1]}{first_row}:{labels[last_col - 1]}{last_row}"
+        for first_row, first_col, last_row, last_col in ranges.tolist()
+    ]
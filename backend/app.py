@@ -1,13 +1,29 @@
 import os
+import shutil
+import threading
+import time
+import uuid
+import zipfile
 from flask import Flask, jsonify, request
 from flask import send_file
-from io import BytesIO
 from werkzeug.utils import secure_filename
-from functions import master_function
+from functions import convert_dxf_to_file, OUTPUT_FORMATS, OUTPUT_VERSION
+from jobs import JobQueue, QueueFullError
+from cache import ResultCache
+from instrumentation import REGISTRY, stage, configure_logging, logger
+from incremental import convert_dxf_incremental_to_file
+from batch import convert_batch_to_file
+from chunked_upload import ChunkedUploadStore, UploadError
+from addressing import column_labels
+from preview import preview_dxf_to_file, read_tile, encode_png, pack_tile, TILE_CELLS
+from warmup import warm_up_worker, write_warmup_drawing
 from flask_cors import CORS
 
 
 
+# Log level of the converter's logs (sampled per-entity events, pipeline messages), set with LOG_LEVEL
+configure_logging(os.environ.get('LOG_LEVEL', 'INFO').upper())
+
 # Configure the Flask app
 app = Flask(__name__)
 
@@ -25,8 +41,66 @@ if not os.path.exists(UPLOAD_FOLDER):  # Create folder if it doesn't exist
 
 ALLOWED_EXTENSIONS = {'dxf'}
 
+# Largest drawing accepted, set with the MAX_UPLOAD_BYTES environment variable (default 2 GB)
+# Larger drawings should use the chunked /uploads routes, which keep one chunk per request in memory at most
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 2 * 1024 * 1024 * 1024))
+UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024  # Chunk size suggested to clients of the chunked upload
+
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # Max file size of 16 MB
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
+
+# Chunked uploads are assembled here until they are complete
+CHUNK_FOLDER = os.path.join(UPLOAD_FOLDER, 'chunks')
+chunked_uploads = ChunkedUploadStore(CHUNK_FOLDER, max_bytes=MAX_UPLOAD_BYTES)
+
+# Finished workbooks are written here by the job queue
+RESULT_FOLDER = os.path.join(UPLOAD_FOLDER, 'results')
+
+# Production serving (serve.py, gunicorn.conf.py) sets WARM_UP=1: the conversion and preview workers are
+# started and run a tiny conversion of WARMUP_DRAWING before the app reports ready (see /ready)
+WARM_UP = os.environ.get('WARM_UP') == '1'
+WARMUP_DRAWING = os.path.join(UPLOAD_FOLDER, 'warmup.dxf')
+WORKER_OPTIONS = {'initializer': warm_up_worker, 'initargs': (WARMUP_DRAWING,)} if WARM_UP else {}
+
+# Finished jobs (conversions, batches and previews) and their result files are removed after this many seconds;
+# uploaded drawings are removed as soon as their job finishes
+JOB_EXPIRY_SECONDS = 3600
+
+# Conversions run on a local worker pool: at most JOB_WORKERS at once and JOB_QUEUE_DEPTH queued or running
+JOB_WORKERS = 2
+JOB_QUEUE_DEPTH = 8
+job_queue = JobQueue(RESULT_FOLDER, max_workers=JOB_WORKERS, max_pending=JOB_QUEUE_DEPTH,
+                     expiry_seconds=JOB_EXPIRY_SECONDS, **WORKER_OPTIONS)
+
+# Finished workbooks are cached by a hash of the DXF bytes, the output version and the grid parameters
+CACHE_FOLDER = os.path.join(UPLOAD_FOLDER, 'cache')
+CACHE_DISK_BYTES = 1024 * 1024 * 1024
+result_cache = ResultCache(CACHE_FOLDER, disk_bytes=CACHE_DISK_BYTES)
+
+# Uploads with a "project" form field are diffed against the project's previous upload; projects that get
+# no upload for PROJECT_EXPIRY_SECONDS are removed
+PROJECT_FOLDER = os.path.join(UPLOAD_FOLDER, 'projects')
+PROJECT_EXPIRY_SECONDS = 30 * 24 * 3600
+
+# Batches (POST /batch) run one at a time; each converts its drawings on a pool of BATCH_WORKERS processes
+BATCH_WORKERS = os.cpu_count()
+BATCH_QUEUE_DEPTH = 2
+BATCH_MAX_UNCOMPRESSED_BYTES = 1024 * 1024 * 1024  # Total size of the DXFs extracted from uploaded zips
+batch_queue = JobQueue(RESULT_FOLDER, max_workers=1, max_pending=BATCH_QUEUE_DEPTH, executor="thread",
+                       result_suffix=".zip", expiry_seconds=JOB_EXPIRY_SECONDS)
+
+# Previews (POST /preview) stop after the grid mapping; they get their own worker so they do not wait behind conversions
+PREVIEW_WORKERS = 1
+PREVIEW_QUEUE_DEPTH = 8
+preview_queue = JobQueue(RESULT_FOLDER, max_workers=PREVIEW_WORKERS, max_pending=PREVIEW_QUEUE_DEPTH,
+                         result_suffix=".npz", expiry_seconds=JOB_EXPIRY_SECONDS, **WORKER_OPTIONS)
+
+# Output format clients can ask for with the "format" field on /upload, /uploads/<id>/complete and /batch,
+# mapped to the writer that produces it: a workbook or a compact export of the merged ranges
+OUTPUT_WRITERS = {'xlsx': 'xml', 'csv': 'csv', 'json': 'json', 'rle': 'rle'}
+
+# Send this header with value 1 on /upload to profile the conversion, the report is served by /jobs/<id>/profile
+PROFILE_HEADER = 'X-Profile'
 
 # Function to check if the file has a valid extension
 def allowed_file(filename):
@@ -40,9 +114,128 @@ cell_width = 1150      # Width of each grid cell
 cell_height = 1150      # Height of each grid cell
 grid_rows = 10000        # Total number of rows
 grid_columns = 10000     # Total number of columns# Step 1: Read LWPOLYLINE entities from DXF
+
+# Build the column label table once for the whole grid, worker processes forked from here inherit it
+column_labels(grid_columns)
+
+# Panels are read with the block-aware reader, so panels placed as block references (INSERT) are included
+READER = "blocks"
+# Only panels on these layers are converted, set as a comma-separated list in the PANEL_LAYERS environment
+# variable (e.g. "SOL-PV MODULES"); None converts panels on every layer
+PANEL_LAYERS = [layer for layer in os.environ.get('PANEL_LAYERS', '').split(',') if layer.strip()] or None
     
 
 
+# Warm-up state reported by /health and /ready: "disabled" (workers start on the first job), "cold", "warming",
+# "ready" or "failed"
+warm_up_status = {"status": "cold" if WARM_UP else "disabled", "workers": 0, "seconds": None, "error": None}
+
+
+# Starts the conversion and preview workers and waits until each has run its warm-up conversion
+def warm_up():
+    warm_up_status["status"] = "warming"
+    start = time.perf_counter()
+    try:
+        write_warmup_drawing(WARMUP_DRAWING)
+        workers = job_queue.start() + preview_queue.start()
+    except Exception as error:
+        warm_up_status.update(status="failed", error=str(error))
+        logger.error(f"Warm-up failed: {error}")
+        return
+    warm_up_status.update(status="ready", workers=workers, seconds=round(time.perf_counter() - start, 2))
+    logger.info(f"Warmed up {workers} workers in {warm_up_status['seconds']} s")
+
+
+# Runs the warm-up in the background, the app answers /health (and /ready with 503) meanwhile
+# Call it in the process that serves requests, after any fork of the server (see gunicorn.conf.py)
+def start_warm_up():
+    if WARM_UP and warm_up_status["status"] == "cold":
+        threading.Thread(target=warm_up, daemon=True).start()
+
+
+
+# Called when a conversion job succeeds: caches the workbook and adds the worker's stage metrics
+def job_finished(cache_key, extension, result_path, info):
+    result_cache.put_file(cache_key, result_path, extension)
+    REGISTRY.merge(info.get("metrics", {}))
+
+
+
+# Returns the writer for the requested output format, or None for an unknown format
+def requested_writer(data):
+    return OUTPUT_WRITERS.get(str(data.get('format', 'xlsx')).lower())
+
+
+# Queues the conversion of a saved drawing (shared by /upload and the chunked upload)
+# Returns the JSON response with the job id
+def queue_conversion(file_path, project_key, profile, writer):
+    if writer is None:
+        os.remove(file_path)
+        return jsonify({"error": f"Unknown format, use one of {', '.join(OUTPUT_WRITERS)}."}), 400
+
+    # Revisions of a project are diffed against its previous upload (not cached, the project state changes)
+    if project_key:
+        if OUTPUT_FORMATS[writer][0] != 'xlsx':
+            os.remove(file_path)
+            return jsonify({"error": "Project uploads are only converted to xlsx."}), 400
+        try:
+            job_id = job_queue.submit(convert_dxf_incremental_to_file, file_path, grid_origin, grid_rows, grid_columns,
+                                      project_key=project_key, project_folder=PROJECT_FOLDER,
+                                      project_expiry_seconds=PROJECT_EXPIRY_SECONDS,
+                                      reader=READER, layers=PANEL_LAYERS, writer=writer, cleanup=(file_path,),
+                                      on_done=lambda result_path, info: REGISTRY.merge(info.get("metrics", {})))
+        except QueueFullError:
+            os.remove(file_path)
+            return jsonify({"error": "Too many conversions in progress, please try again later."}), 503
+
+        logger.info(f"Queued incremental job {job_id} for project {project_key}")
+        return jsonify({"job_id": job_id, "status": "queued"}), 202
+
+    # Identical drawings with the same grid parameters reuse the stored workbook (written by the same version)
+    with stage("upload_hash"):
+        cache_key = ResultCache.key(file_path, OUTPUT_VERSION, grid_origin, grid_rows, grid_columns, READER,
+                                    PANEL_LAYERS, writer)
+    cached_path = result_cache.get(cache_key)
+    if cached_path is not None:
+        extension, mimetype = OUTPUT_FORMATS[writer]
+        try:
+            job_id = job_queue.complete(cached_path, {"download_name": f"grid_cells_output.{extension}",
+                                                      "mimetype": mimetype})
+        except FileNotFoundError:
+            pass  # Evicted in the meantime, convert it again
+        else:
+            os.remove(file_path)
+            logger.info(f"Cache hit, finished job {job_id}")
+            return jsonify({"job_id": job_id, "status": "done"}), 202
+
+    # Queue master_function with the predefined parameters instead of running it inside the request
+    try:
+        job_id = job_queue.submit(convert_dxf_to_file, file_path, grid_origin, grid_rows, grid_columns,
+                                  reader=READER, layers=PANEL_LAYERS, writer=writer, profile=profile, cleanup=(file_path,),
+                                  on_done=lambda result_path, info: job_finished(cache_key, OUTPUT_FORMATS[writer][0], result_path, info))
+    except QueueFullError:
+        os.remove(file_path)
+        return jsonify({"error": "Too many conversions in progress, please try again later."}), 503
+
+    logger.info(f"Queued job {job_id}")
+    return jsonify({"job_id": job_id, "status": "queued"}), 202
+
+
+# Queues the preview of a saved drawing (shared by /preview and the chunked upload)
+def queue_preview(file_path):
+    try:
+        job_id = preview_queue.submit(preview_dxf_to_file, file_path, grid_origin, grid_rows, grid_columns,
+                                      reader=READER, layers=PANEL_LAYERS, cleanup=(file_path,),
+                                      on_done=lambda result_path, info: REGISTRY.merge(info.get("metrics", {})))
+    except QueueFullError:
+        os.remove(file_path)
+        return jsonify({"error": "Too many previews in progress, please try again later."}), 503
+
+    logger.info(f"Queued preview {job_id}")
+    return jsonify({"job_id": job_id, "status": "queued"}), 202
+
+
+
 # Route to handle file uploads
 @app.route('/upload', methods=['POST'])
 def upload_file():
@@ -60,41 +253,324 @@ def upload_file():
         return jsonify({"error": "No selected file"}), 400
     
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
+        # Prefix the name so concurrent uploads of the same drawing do not overwrite each other
+        filename = f"{uuid.uuid4().hex}_{secure_filename(file.filename)}"
         file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
 
         print(f"Saving file to {file_path}")  # Debugging log
-        file.save(file_path)
-
-        # Now call master_function with the predefined parameters
-        excel_io = master_function(file_path, grid_origin, grid_rows, grid_columns)
-        print(f"Received object from master_function: {type(excel_io)}")  # Debugging log
-        print("Processing complete!")  # Debugging log
-
-                # Send the in-memory file as a response for download
-        # Ensure that we have a BytesIO object and return it using send_file
-        if isinstance(excel_io, BytesIO):
-            return send_file(
-                excel_io,
-                as_attachment=True,
-                download_name="grid_cells_output.xlsx",
-                mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
-        else:
-            print("Error: Expected a BytesIO object, but got something else.")
-            return jsonify({"error": "Something went wrong, file could not be generated."}), 500
+        with stage("upload_save"):
+            file.save(file_path)
 
-        return jsonify(result)
+        return queue_conversion(file_path, secure_filename(request.form.get('project', '')),
+                                request.headers.get(PROFILE_HEADER) == '1', requested_writer(request.form))
     
     print("Invalid file type")
     return jsonify({"error": "Invalid file type. Only DXF files are allowed."}), 400
 
 
 
+# Routes for resumable chunked uploads of large drawings:
+#   POST /uploads with JSON {"filename", "size"} starts an upload and returns its upload_id
+#   PUT /uploads/<id> with the Upload-Offset header and the raw bytes of one chunk as body appends the chunk
+#   GET /uploads/<id> returns the offset to resume from after an interrupted upload
+#   POST /uploads/<id>/complete (optional form field or JSON "project") queues the conversion like /upload,
+#   or the preview like /preview with "preview" set to true
+@app.route('/uploads', methods=['POST'])
+def start_upload():
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(str(data.get('filename', '')))
+    if not allowed_file(filename):
+        return jsonify({"error": "Invalid file type. Only DXF files are allowed."}), 400
+
+    try:
+        upload_id = chunked_uploads.start(filename, int(data.get('size', -1)))
+    except (UploadError, ValueError) as error:
+        return jsonify({"error": str(error), "max_bytes": MAX_UPLOAD_BYTES}), 413
+
+    logger.info(f"Started chunked upload {upload_id} of {filename}")
+    return jsonify({"upload_id": upload_id, "offset": 0, "chunk_bytes": UPLOAD_CHUNK_BYTES}), 201
+
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    try:
+        return jsonify({"upload_id": upload_id, **chunked_uploads.status(upload_id)})
+    except UploadError as error:
+        return jsonify({"error": str(error)}), 404
+
+
+@app.route('/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return jsonify({"error": "Missing Upload-Offset header"}), 400
+
+    try:
+        with stage("upload_save"):
+            offset = chunked_uploads.append(upload_id, offset, request.stream)
+    except UploadError as error:
+        # The client resumes from the offset the server has
+        try:
+            status = chunked_uploads.status(upload_id)
+        except UploadError:
+            return jsonify({"error": str(error)}), 404
+        return jsonify({"error": str(error), "offset": status["offset"]}), 409
+
+    return jsonify({"upload_id": upload_id, "offset": offset})
+
+
+@app.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    try:
+        status = chunked_uploads.status(upload_id)
+        file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{upload_id}_{status['filename']}")
+        chunked_uploads.finish(upload_id, file_path)
+    except UploadError as error:
+        return jsonify({"error": str(error)}), 409
+
+    data = request.get_json(silent=True) or request.form
+    if str(data.get('preview', '')).lower() in ('1', 'true'):
+        return queue_preview(file_path)
+    return queue_conversion(file_path, secure_filename(str(data.get('project', ''))),
+                            request.headers.get(PROFILE_HEADER) == '1', requested_writer(data))
+
+
+
+# Every drawing of a batch gets its own subfolder, so drawings with the same name keep their name
+def batch_file_path(folder, index, name):
+    file_folder = os.path.join(folder, str(index))
+    os.makedirs(file_folder)
+    return os.path.join(file_folder, name)
+
+
+# Saves the DXFs of a batch upload (plain .dxf files and the .dxf members of .zip files) to folder
+# Returns (saved paths, rejected file names)
+def save_batch_files(files, folder):
+    saved, rejected = [], []
+    for file in files:
+        name = secure_filename(file.filename)
+        if allowed_file(name):
+            file_path = batch_file_path(folder, len(saved), name)
+            file.save(file_path)
+            saved.append(file_path)
+            continue
+
+        if not name.lower().endswith('.zip'):
+            rejected.append(file.filename)
+            continue
+
+        try:
+            archive = zipfile.ZipFile(file.stream)
+        except zipfile.BadZipFile:
+            rejected.append(file.filename)
+            continue
+        with archive:
+            members = [member for member in archive.infolist()
+                       if not member.is_dir() and allowed_file(os.path.basename(member.filename))]
+            if sum(member.file_size for member in members) > BATCH_MAX_UNCOMPRESSED_BYTES:
+                rejected.append(file.filename)
+                continue
+            for member in members:
+                # Only the base name is used, so members cannot be written outside the batch folder
+                file_path = batch_file_path(folder, len(saved), secure_filename(os.path.basename(member.filename)))
+                with archive.open(member) as source, open(file_path, 'wb') as target:
+                    while True:
+                        chunk = source.read(1024 * 1024)
+                        if not chunk:
+                            break
+                        target.write(chunk)
+                saved.append(file_path)
+    return saved, rejected
+
+
+# Route to convert several drawings at once: a zip of DXFs and/or several DXF files in the "files" field
+# The result of the job is a zip with one workbook (or compact export) per drawing and report.json with the per-file status
+@app.route('/batch', methods=['POST'])
+def upload_batch():
+    files = [file for file in request.files.getlist('files') if file.filename]
+    if not files:
+        logger.warning("No files in batch request")
+        return jsonify({"error": "No files"}), 400
+    writer = requested_writer(request.form)
+    if writer is None:
+        return jsonify({"error": f"Unknown format, use one of {', '.join(OUTPUT_WRITERS)}."}), 400
+
+    folder = os.path.join(app.config['UPLOAD_FOLDER'], f"batch_{uuid.uuid4().hex}")
+    os.makedirs(folder)
+    with stage("upload_save"):
+        file_paths, rejected = save_batch_files(files, folder)
+    if not file_paths:
+        shutil.rmtree(folder, ignore_errors=True)
+        return jsonify({"error": "No DXF files in the upload.", "rejected": rejected}), 400
+
+    try:
+        job_id = batch_queue.submit(convert_batch_to_file, file_paths, grid_origin, grid_rows, grid_columns,
+                                    workers=BATCH_WORKERS, reader=READER, layers=PANEL_LAYERS, writer=writer,
+                                    cleanup=(folder,))
+    except QueueFullError:
+        shutil.rmtree(folder, ignore_errors=True)
+        return jsonify({"error": "Too many batches in progress, please try again later."}), 503
+
+    logger.info(f"Queued batch job {job_id} with {len(file_paths)} drawings")
+    return jsonify({"job_id": job_id, "status": "queued", "files": len(file_paths), "rejected": rejected}), 202
+
+
+
+# Looks up a job in the single-file, the batch and the preview queue
+def find_job(job_id):
+    for queue in (job_queue, batch_queue, preview_queue):
+        job = queue.status(job_id)
+        if job is not None:
+            return job
+    return None
+
+
+# Route to report the status of a conversion job
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = find_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+
+    # peak_rss_mb is reported by the worker that ran the conversion
+    # diff is only set for incremental (project) uploads, report only for batches
+    return jsonify({"job_id": job_id, "status": job["status"], "error": job["error"],
+                    "peak_rss_mb": job["info"].get("peak_rss_mb"), "diff": job["info"].get("diff"),
+                    "report": job["info"].get("report")})
+
+
+# Route to download the workbook of a finished conversion job
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = find_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    if job["status"] == "failed":
+        return jsonify({"error": "Something went wrong, file could not be generated."}), 500
+    if job["status"] != "done":
+        return jsonify({"error": "Job has not finished yet", "status": job["status"]}), 409
+
+    # send_file streams the workbook (or the zip of a batch) from disk
+    return send_file(
+        os.path.abspath(job["result_path"]),
+        as_attachment=True,
+        download_name=job["info"].get("download_name", "grid_cells_output.xlsx"),
+        mimetype=job["info"].get("mimetype", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    )
+
+
+
+# Route to check a drawing without building the workbook: reads and maps the panels and returns a job id like /upload
+# Poll /jobs/<id>, then GET /previews/<id> for the stats and tile layout and
+# GET /previews/<id>/tiles/<zoom>/<tile_row>/<tile_column> for the tiles
+@app.route('/preview', methods=['POST'])
+def upload_preview():
+    file = request.files.get('file')
+    if file is None or file.filename == '':
+        logger.warning("No file in preview request")
+        return jsonify({"error": "No selected file"}), 400
+    if not allowed_file(file.filename):
+        return jsonify({"error": "Invalid file type. Only DXF files are allowed."}), 400
+
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4().hex}_{secure_filename(file.filename)}")
+    with stage("upload_save"):
+        file.save(file_path)
+    return queue_preview(file_path)
+
+
+# Looks up a finished preview, returns (job, None) or (None, error response)
+def finished_preview(job_id):
+    job = preview_queue.status(job_id)
+    if job is None:
+        return None, (jsonify({"error": "Unknown preview"}), 404)
+    if job["status"] == "failed":
+        return None, (jsonify({"error": "Something went wrong, preview could not be generated."}), 500)
+    if job["status"] != "done":
+        return None, (jsonify({"error": "Preview has not finished yet", "status": job["status"]}), 409)
+    return job, None
+
+
+# Route to report the mapping stats of a preview (cell size, panel counts, stage timings) and its tile layout
+@app.route('/previews/<job_id>', methods=['GET'])
+def preview_stats(job_id):
+    job, error = finished_preview(job_id)
+    if error:
+        return error
+    return jsonify({"job_id": job_id, "tile_cells": TILE_CELLS, "stats": job["info"]["stats"],
+                    "levels": job["info"]["layout"]})
+
+
+# Route to serve one tile of a preview, as a PNG (default) or with ?format=bits as bit-packed rows
+# (the tile size is in the X-Tile-Rows and X-Tile-Columns headers)
+@app.route('/previews/<job_id>/tiles/<int:zoom>/<int:tile_row>/<int:tile_column>', methods=['GET'])
+def preview_tile(job_id, zoom, tile_row, tile_column):
+    job, error = finished_preview(job_id)
+    if error:
+        return error
+    tile = read_tile(job["result_path"], zoom, tile_row, tile_column)
+    if tile is None:
+        return jsonify({"error": "Unknown tile"}), 404
+
+    headers = {"X-Tile-Rows": str(tile.shape[0]), "X-Tile-Columns": str(tile.shape[1]),
+               "Cache-Control": "private, max-age=3600"}
+    if request.args.get('format') == 'bits':
+        return pack_tile(tile), 200, dict(headers, **{"Content-Type": "application/octet-stream"})
+    return encode_png(tile), 200, dict(headers, **{"Content-Type": "image/png"})
+
+
+
+# Route to download the cProfile report of a job uploaded with the X-Profile header
+@app.route('/jobs/<job_id>/profile', methods=['GET'])
+def job_profile(job_id):
+    job = job_queue.status(job_id)
+    if job is None or not job["info"].get("profile"):
+        return jsonify({"error": "No profile for this job"}), 404
+
+    return job["info"]["profile"], 200, {"Content-Type": "text/plain; charset=utf-8"}
+
+
+# Route to expose stage timings, event counters, cache and queue state in Prometheus text format
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    cache = result_cache.stats()
+    gauges = {
+        "dxf_jobs_pending": ("Conversion jobs queued or running.", job_queue.pending()),
+        "dxf_batches_pending": ("Batch jobs queued or running.", batch_queue.pending()),
+        "dxf_previews_pending": ("Preview jobs queued or running.", preview_queue.pending()),
+        "dxf_cache_hits": ("Result cache hits.", cache["hits"]),
+        "dxf_cache_misses": ("Result cache misses.", cache["misses"]),
+        "dxf_cache_disk_bytes": ("Size of the on-disk result cache.", cache["disk_bytes"]),
+    }
+    return REGISTRY.render_prometheus(gauges), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+
+# Route to report the result cache hit/miss counters
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(result_cache.stats())
+
+
+
+# Liveness: the app answers requests, with the warm-up state and queue lengths
+@app.route('/health', methods=['GET'])
+def health():
+    return jsonify({"status": "ok", "warm_up": warm_up_status, "jobs_pending": job_queue.pending(),
+                    "previews_pending": preview_queue.pending(), "batches_pending": batch_queue.pending()})
+
+
+# Readiness: 200 once the workers are warmed up (or warm-up is disabled), 503 before that or if it failed
+@app.route('/ready', methods=['GET'])
+def ready():
+    is_ready = warm_up_status["status"] in ("ready", "disabled")
+    return jsonify(warm_up_status), 200 if is_ready else 503
+
+
+
 @app.route('/')
 def home():
     return "Flask server is running!"
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5001)
+    app.run(debug=True, port=int(os.environ.get('PORT', 5001)))
 
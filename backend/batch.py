@@ -0,0 +1,140 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+import traceback
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from functions import master_function, OUTPUT_FORMATS
+from instrumentation import configure_logging, logger
+
+
+
+#########################################################################################################################################################################################
+# Batch conversion: many drawings converted in parallel, results returned as one zip with a per-file report
+#########################################################################################################################################################################################
+
+def _convert_one(file_path, output_path, grid_origin, grid_rows, grid_columns, options):
+    """
+    Worker: converts one drawing to output_path. Errors are returned instead of raised so one
+    broken drawing does not stop the batch.
+
+    :return: Dictionary with the status, the error (if any) and the conversion time
+    """
+    start = time.perf_counter()
+    try:
+        master_function(file_path, grid_origin, grid_rows, grid_columns, output=output_path, **options)
+        return {"status": "ok", "seconds": round(time.perf_counter() - start, 3)}
+    except Exception as error:
+        return {"status": "failed", "error": f"{type(error).__name__}: {error}",
+                "traceback": traceback.format_exc(), "seconds": round(time.perf_counter() - start, 3)}
+
+
+def convert_batch(file_paths, zip_path, grid_origin, grid_rows, grid_columns, workers=None, **options):
+    """
+    Converts every drawing in a process pool and writes <name>.xlsx (or the extension of the chosen writer)
+    for each successful one plus report.json (status, error and time per drawing) to zip_path.
+
+    :param file_paths: Paths of the DXF files; their base names (without .dxf) name the workbooks,
+                       a counter is added to repeated names
+    :param options: Passed on to master_function (reader, pipeline, writer, layers)
+    :return: The report dictionary {file name: {"status", "error", "seconds"}}
+    """
+    extension = OUTPUT_FORMATS[options.get("writer", "openpyxl")][0]
+    work_folder = tempfile.mkdtemp(prefix="dxf_batch_")
+    report = {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+            used_names = set()
+            for index, file_path in enumerate(file_paths):
+                name = _unique(os.path.basename(file_path), used_names)
+                output_path = os.path.join(work_folder, str(index))
+                future = executor.submit(_convert_one, file_path, output_path, grid_origin, grid_rows, grid_columns, options)
+                futures[future] = (name, output_path)
+
+            with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+                # Add each workbook as soon as it is done, so finished files do not wait for slow ones
+                for future in as_completed(futures):
+                    name, output_path = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as error:  # The worker process itself died
+                        result = {"status": "failed", "error": f"{type(error).__name__}: {error}"}
+                    report[name] = result
+
+                    if result["status"] == "ok":
+                        zf.write(output_path, f"{os.path.splitext(name)[0]}.{extension}")
+                        os.remove(output_path)
+                    else:
+                        logger.warning(f"{name}: {result['error']}")
+
+                zf.writestr("report.json", json.dumps(report, indent=2))
+    finally:
+        shutil.rmtree(work_folder, ignore_errors=True)
+
+    return report
+
+
+def _unique(name, used_names):
+    """
+    Returns name, or name with a counter added if it was already used in the batch.
+    """
+    base, extension = os.path.splitext(name)
+    candidate, counter = name, 1
+    while candidate in used_names:
+        candidate = f"{base}_{counter}{extension}"
+        counter += 1
+    used_names.add(candidate)
+    return candidate
+
+
+def convert_batch_to_file(file_paths, grid_origin, grid_rows, grid_columns, result_path, workers=None, **options):
+    """
+    Job entry point for convert_batch (see functions.convert_dxf_to_file).
+
+    :return: Dictionary with the result_path, how to serve it and the per-file report
+    """
+    report = convert_batch(file_paths, result_path, grid_origin, grid_rows, grid_columns, workers=workers, **options)
+    return {
+        "result_path": result_path,
+        "download_name": "grid_cells_output.zip",
+        "mimetype": "application/zip",
+        "report": {name: {key: value for key, value in result.items() if key != "traceback"}
+                   for name, result in report.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert every DXF file in a directory to Excel grids in parallel.")
+    parser.add_argument("directory", help="Directory with the DXF files")
+    parser.add_argument("-o", "--output", default="grid_cells_output.zip", help="Zip file to write")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (defaults to the CPU count)")
+    parser.add_argument("--grid-rows", type=int, default=10000)
+    parser.add_argument("--grid-columns", type=int, default=10000)
+    parser.add_argument("--reader", default="blocks", help="DXF reader, see master_function")
+    parser.add_argument("--layers", nargs="+", default=None, help="Only convert panels on these layers")
+    parser.add_argument("--writer", default="xml", help="Excel writer backend or compact export, see master_function")
+    args = parser.parse_args()
+    configure_logging()
+
+    file_paths = sorted(
+        os.path.join(args.directory, name) for name in os.listdir(args.directory) if name.lower().endswith(".dxf"))
+    if not file_paths:
+        parser.error(f"No .dxf files in {args.directory}")
+
+    start = time.perf_counter()
+    report = convert_batch(file_paths, args.output, (0, 0), args.grid_rows, args.grid_columns,
+                           workers=args.workers, reader=args.reader, writer=args.writer, layers=args.layers)
+    failed = [name for name, result in report.items() if result["status"] != "ok"]
+    print(f"Converted {len(report) - len(failed)} of {len(report)} drawings in "
+          f"{time.perf_counter() - start:.1f} s, written to {args.output}")
+    if failed:
+        print(f"Failed: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
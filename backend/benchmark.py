@@ -0,0 +1,200 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import ezdxf
+
+import functions
+from instrumentation import collect
+
+
+
+#########################################################################################################################################################################################
+# Synthetic DXF generator: tables of panels in mixed orientations plus noise entities
+#########################################################################################################################################################################################
+
+PANEL_LONG = 2329.8
+PANEL_SHORT = 1134.0
+PANEL_GAP = 25.0
+TABLE_PANELS = 20  # Panels per table row
+TABLE_ROWS = 2  # Panel rows per table
+AISLE = 5000.0  # Space between tables
+
+
+def generate_dxf(file_path, panels, noise=0.2, seed=0):
+    """
+    Writes a DXF with `panels` closed rectangular LWPOLYLINEs laid out in tables, a third of them
+    in portrait orientation, plus noise entities (text, lines, circles, open and 5-vertex polylines).
+
+    :param noise: Number of noise entities per panel
+    """
+    rng = random.Random(seed)
+    doc = ezdxf.new("R2010")
+    msp = doc.modelspace()
+    doc.layers.add("SOL-PV MODULES")
+    doc.layers.add("NOISE")
+
+    table_size = TABLE_PANELS * TABLE_ROWS
+    tables = (panels + table_size - 1) // table_size
+    tables_per_row = max(1, int(tables ** 0.5))
+
+    placed = 0
+    for table in range(tables):
+        portrait = table % 3 == 2
+        width, height = (PANEL_SHORT, PANEL_LONG) if portrait else (PANEL_LONG, PANEL_SHORT)
+        table_x = (table % tables_per_row) * (TABLE_PANELS * (PANEL_LONG + PANEL_GAP) + AISLE)
+        table_y = (table // tables_per_row) * (TABLE_ROWS * (PANEL_LONG + PANEL_GAP) + AISLE)
+
+        for row in range(TABLE_ROWS):
+            for col in range(TABLE_PANELS):
+                if placed == panels:
+                    break
+                x = table_x + col * (width + PANEL_GAP)
+                y = table_y + row * (height + PANEL_GAP)
+                msp.add_lwpolyline([(x, y), (x + width, y), (x + width, y + height), (x, y + height)],
+                                   close=True, dxfattribs={"layer": "SOL-PV MODULES"})
+                placed += 1
+
+    extent = tables_per_row * TABLE_PANELS * (PANEL_LONG + PANEL_GAP)
+    for _ in range(int(panels * noise)):
+        x, y = rng.uniform(0, extent), rng.uniform(0, extent)
+        kind = rng.randrange(5)
+        if kind == 0:
+            msp.add_text("PV", dxfattribs={"layer": "NOISE", "insert": (x, y)})
+        elif kind == 1:
+            msp.add_line((x, y), (x + 500, y + 500), dxfattribs={"layer": "NOISE"})
+        elif kind == 2:
+            msp.add_circle((x, y), 300, dxfattribs={"layer": "NOISE"})
+        elif kind == 3:
+            msp.add_lwpolyline([(x, y), (x + 800, y), (x + 800, y + 400), (x, y + 400)], close=False,
+                               dxfattribs={"layer": "NOISE"})
+        else:
+            msp.add_lwpolyline([(x, y), (x + 800, y), (x + 900, y + 300), (x + 400, y + 600), (x, y + 300)],
+                               close=True, dxfattribs={"layer": "NOISE"})
+
+    doc.saveas(file_path)
+    return file_path
+
+
+#########################################################################################################################################################################################
+# Stage timing: the stage spans master_function records (see instrumentation), so the deployed pipeline is what gets timed
+#########################################################################################################################################################################################
+
+def _run_pipeline(file_path, reader, writer, grid_rows, grid_columns):
+    """
+    Runs master_function once and collects its stage spans and events.
+
+    :return: Tuple (collected metrics, wall seconds of the whole conversion, output bytes)
+    """
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), collect() as metrics:
+        excel_io = functions.master_function(file_path, (0, 0), grid_rows, grid_columns, reader=reader, writer=writer)
+    return metrics, time.perf_counter() - start, len(excel_io.getbuffer())
+
+
+def _span_totals(metrics, key):
+    """
+    Sums one value of the collected spans per stage, in the order the stages ran.
+    """
+    totals = {}
+    for span in metrics["spans"]:
+        totals[span["stage"]] = totals.get(span["stage"], 0) + span[key]
+    return totals
+
+
+def benchmark_file(file_path, reader="blocks", writer="xml", grid_rows=10000, grid_columns=10000, trace_memory=True):
+    """
+    Times every stage of master_function on one DXF file, using the spans its stages record.
+
+    tracemalloc slows allocation-heavy stages down several times, so the stages are timed in an
+    untraced run and, with trace_memory, their peak allocation is measured in a second, traced run
+    (stage() measures it with tracemalloc while tracing).
+
+    :return: Dictionary with per-stage seconds and peak allocation, event counts (e.g. collisions),
+             panel counts and output size
+    """
+    metrics, total_seconds, output_bytes = _run_pipeline(file_path, reader, writer, grid_rows, grid_columns)
+    entities = _span_totals(metrics, "entities")
+    stages = {stage: {"seconds": round(seconds, 4)} for stage, seconds in _span_totals(metrics, "wall_seconds").items()}
+
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            traced, _, _ = _run_pipeline(file_path, reader, writer, grid_rows, grid_columns)
+        finally:
+            tracemalloc.stop()
+        for span in traced["spans"]:
+            stage = stages.setdefault(span["stage"], {})
+            stage["peak_alloc_mb"] = round(max(stage.get("peak_alloc_mb", 0), span["peak_alloc_bytes"] / (1024 * 1024)), 2)
+
+    return {
+        "file_bytes": os.path.getsize(file_path),
+        "panels": entities.get("read", 0),
+        "mapped": entities.get("write", 0),
+        "reader": reader,
+        "writer": writer,
+        "stages": stages,
+        "events": metrics["events"],
+        "total_seconds": round(total_seconds, 4),
+        "peak_rss_mb": round(functions.peak_rss_mb(), 1),
+        "output_bytes": output_bytes,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the DXF to Excel conversion pipeline on synthetic drawings.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="Panel counts to benchmark")
+    parser.add_argument("--reader", default="blocks", choices=["mmap", "parallel", "blocks", "stream", "ezdxf"],
+                        help="DXF reader, see master_function (the app uses blocks)")
+    parser.add_argument("--writer", default="xml", choices=sorted(functions.EXCEL_WRITERS), help="Excel writer backend")
+    parser.add_argument("--noise", type=float, default=0.2, help="Noise entities per panel")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "dxf_benchmark"),
+                        help="Folder for the generated drawings (reused between runs)")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file to write the results to")
+    parser.add_argument("--no-trace-memory", action="store_true", help="Skip the traced run that measures peak allocation per stage")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.data_dir):
+        os.makedirs(args.data_dir)
+
+    runs = []
+    for size in args.sizes:
+        file_path = os.path.join(args.data_dir, f"synthetic_{size}_{args.noise}.dxf")
+        if not os.path.exists(file_path):
+            print(f"Generating {file_path}")
+            generate_dxf(file_path, size, noise=args.noise)
+
+        result = benchmark_file(file_path, reader=args.reader, writer=args.writer, trace_memory=not args.no_trace_memory)
+        result["size"] = size
+        runs.append(result)
+        print(f"{size} panels: {result['total_seconds']} s, " +
+              ", ".join(f"{stage} {values['seconds']} s" for stage, values in result["stages"].items()))
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "runs": runs,
+    }
+    with open(args.output, "w") as output_file:
+        json.dump(report, output_file, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
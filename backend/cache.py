@@ -0,0 +1,136 @@
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+
+
+
+#########################################################################################################################################################################################
+# Content-addressed result cache: identical drawings + grid parameters return the stored workbook
+#########################################################################################################################################################################################
+
+def link_file(source_path, target_path):
+    """
+    Hard-links source_path to target_path (copies it where links are not supported, e.g. across file systems),
+    replacing target_path atomically. The file is never read into memory.
+    """
+    temporary_path = f"{target_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        os.link(source_path, temporary_path)
+    except OSError:
+        shutil.copyfile(source_path, temporary_path)
+    os.replace(temporary_path, target_path)
+
+
+class ResultCache:
+    """
+    Cache of finished workbooks (and compact exports) on disk, keyed by a hash of the DXF bytes and the
+    conversion parameters.
+
+    Every entry is one <key>.<extension> file in folder, with the extension of its format; the least recently
+    used files are evicted once their total size exceeds disk_bytes. Entries are stored and handed out by hard
+    link (see link_file), so workbooks are never held in memory.
+
+    There is no in-memory tier in front of the disk: every hit has to end up as a result file of the job queue
+    anyway, which a hard link provides without reading or writing the workbook, while a copy in memory would
+    have to be written back to disk on each hit. Recently used entries stay in the OS page cache, and only the
+    LRU index (key, file name, size) is kept in memory.
+    """
+
+    def __init__(self, folder, disk_bytes=1024 * 1024 * 1024):
+        self.folder = folder
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+        self.disk_bytes = disk_bytes
+        self.disk = OrderedDict()  # key -> (file name, file size), least recently used first
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+        # Pick up entries from a previous run, oldest first
+        entries = []
+        for name in os.listdir(folder):
+            if name.endswith(".tmp"):
+                continue  # Being linked in (see link_file)
+            path = os.path.join(folder, name)
+            entries.append((os.path.getmtime(path), name.split(".", 1)[0], name, os.path.getsize(path)))
+        for _, key, name, size in sorted(entries):
+            if key in self.disk:
+                os.remove(os.path.join(folder, self.disk[key][0]))  # Stored under an older extension
+            self.disk[key] = (name, size)
+
+    @staticmethod
+    def key(file_path, *params):
+        """
+        Hashes the DXF file contents together with the conversion parameters.
+
+        The cell size is derived from the drawing itself, so it is covered by the file hash;
+        params should hold everything else that changes the output (functions.OUTPUT_VERSION, grid_origin,
+        grid_rows, grid_columns, ...), so entries written by an older version are never served.
+        """
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as dxf_file:
+            for chunk in iter(lambda: dxf_file.read(1024 * 1024), b""):
+                digest.update(chunk)
+        digest.update(repr(params).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Returns the path of the cached workbook, or None on a miss. Link it (see link_file) rather than
+        serving it from the cache folder, the entry can be evicted at any time.
+        """
+        with self.lock:
+            if key in self.disk:
+                path = os.path.join(self.folder, self.disk[key][0])
+                try:
+                    os.utime(path)
+                except IOError:
+                    del self.disk[key]  # Removed behind our back, treat as a miss
+                else:
+                    self.disk.move_to_end(key)
+                    self.hits += 1
+                    return path
+
+            self.misses += 1
+            return None
+
+    def put_file(self, key, file_path, extension="xlsx"):
+        """
+        Stores a finished workbook file (linked, not copied, where possible).
+
+        :param extension: File extension of the output format (see functions.OUTPUT_FORMATS); result files
+                          of the job queue always end in .xlsx
+        """
+        with self.lock:
+            name = f"{key}.{extension}"
+            link_file(file_path, os.path.join(self.folder, name))
+            self.disk[key] = (name, os.path.getsize(file_path))
+            self.disk.move_to_end(key)
+            self._evict_disk()
+
+    def _evict_disk(self):
+        total = sum(size for _, size in self.disk.values())
+        while total > self.disk_bytes and len(self.disk) > 1:
+            _, (name, size) = self.disk.popitem(last=False)
+            try:
+                os.remove(os.path.join(self.folder, name))
+            except OSError:
+                pass
+            total -= size
+
+    def stats(self):
+        """
+        Hit/miss counters and the current size of the cache.
+        """
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_entries": len(self.disk),
+                "disk_bytes": sum(size for _, size in self.disk.values()),
+            }
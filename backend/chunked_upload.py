@@ -0,0 +1,134 @@
+import json
+import os
+import threading
+import time
+import uuid
+
+
+
+#########################################################################################################################################################################################
+# Resumable chunked uploads: each chunk is appended to a file on disk, so no request holds more than one chunk
+#########################################################################################################################################################################################
+
+class UploadError(Exception):
+    """Raised for a chunk that does not fit the upload (wrong offset, too large or unknown upload)."""
+
+
+class ChunkedUploadStore:
+    """
+    Assembles uploads from chunks in folder/<upload_id>.part, with the file name and total size in
+    folder/<upload_id>.json. The size of the .part file is the upload offset, so an interrupted upload
+    can be resumed (also after a restart) by asking for the offset and sending the rest from there.
+    """
+
+    def __init__(self, folder, max_bytes, expiry_seconds=24 * 3600):
+        self.folder = folder
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+        self.max_bytes = max_bytes
+        self.expiry_seconds = expiry_seconds
+        self.lock = threading.Lock()
+        self.upload_locks = {}
+
+    def _paths(self, upload_id):
+        if not upload_id.isalnum():
+            raise UploadError("Unknown upload")
+        return os.path.join(self.folder, f"{upload_id}.json"), os.path.join(self.folder, f"{upload_id}.part")
+
+    def _upload_lock(self, upload_id):
+        with self.lock:
+            return self.upload_locks.setdefault(upload_id, threading.Lock())
+
+    def start(self, filename, size):
+        """
+        Registers a new upload of size bytes and returns its id.
+
+        :raises UploadError: If size is larger than max_bytes
+        """
+        if size < 0 or size > self.max_bytes:
+            raise UploadError(f"Upload size must be between 0 and {self.max_bytes} bytes")
+        self.expire()
+
+        upload_id = uuid.uuid4().hex
+        info_path, part_path = self._paths(upload_id)
+        with open(info_path, "w") as info_file:
+            json.dump({"filename": filename, "size": size}, info_file)
+        open(part_path, "wb").close()
+        return upload_id
+
+    def status(self, upload_id):
+        """
+        Returns {"filename", "size", "offset"} of the upload.
+
+        :raises UploadError: For an unknown upload
+        """
+        info_path, part_path = self._paths(upload_id)
+        try:
+            with open(info_path) as info_file:
+                info = json.load(info_file)
+            info["offset"] = os.path.getsize(part_path)
+        except FileNotFoundError:
+            raise UploadError("Unknown upload")
+        return info
+
+    def append(self, upload_id, offset, stream, chunk_size=1024 * 1024):
+        """
+        Copies stream to the end of the upload in pieces of chunk_size bytes.
+
+        :param offset: Where the client thinks the chunk starts, must equal the current offset
+        :return: The new offset
+        :raises UploadError: If the offset does not match or the chunk runs past the announced size
+        """
+        with self._upload_lock(upload_id):
+            info = self.status(upload_id)
+            if offset != info["offset"]:
+                raise UploadError(f"Expected offset {info['offset']}, got {offset}")
+
+            _, part_path = self._paths(upload_id)
+            written = info["offset"]
+            with open(part_path, "ab") as part_file:
+                while True:
+                    piece = stream.read(chunk_size)
+                    if not piece:
+                        break
+                    written += len(piece)
+                    if written > info["size"]:
+                        part_file.truncate(info["offset"])
+                        raise UploadError(f"Chunk runs past the upload size of {info['size']} bytes")
+                    part_file.write(piece)
+            return written
+
+    def finish(self, upload_id, file_path):
+        """
+        Moves a complete upload to file_path.
+
+        :raises UploadError: If not all bytes have been received
+        """
+        with self._upload_lock(upload_id):
+            info = self.status(upload_id)
+            if info["offset"] != info["size"]:
+                raise UploadError(f"Upload is incomplete: {info['offset']} of {info['size']} bytes received")
+
+            info_path, part_path = self._paths(upload_id)
+            os.replace(part_path, file_path)
+            os.remove(info_path)
+        with self.lock:
+            self.upload_locks.pop(upload_id, None)
+
+    def expire(self):
+        """
+        Removes uploads that have not received a chunk for expiry_seconds.
+        """
+        cutoff = time.time() - self.expiry_seconds
+        for name in os.listdir(self.folder):
+            if not name.endswith(".part"):
+                continue
+            upload_id = name[:-len(".part")]
+            info_path, part_path = self._paths(upload_id)
+            try:
+                if os.path.getmtime(part_path) < cutoff:
+                    os.remove(part_path)
+                    os.remove(info_path)
+            except FileNotFoundError:
+                pass
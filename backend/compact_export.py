@@ -0,0 +1,113 @@
+import json
+import os
+from contextlib import contextmanager
+from io import BytesIO
+
+import numpy as np
+
+from addressing import cells_to_ranges, range_references
+
+
+
+#########################################################################################################################################################################################
+# Compact exports: the merged ranges as CSV or JSON, or the occupied cells as row runs, for tools that do not read xlsx
+#########################################################################################################################################################################################
+
+@contextmanager
+def _open_output(output):
+    """
+    Yields a binary file object for output (a path or a file object), or a BytesIO without output.
+    """
+    if output is None:
+        buffer = BytesIO()
+        yield buffer
+        buffer.seek(0)
+    elif isinstance(output, (str, os.PathLike)):
+        with open(output, "wb") as output_file:
+            yield output_file
+    else:
+        yield output
+
+
+def _write_lines(lines, output):
+    with _open_output(output) as target:
+        chunk = []
+        for line in lines:
+            chunk.append(line)
+            if len(chunk) >= 4096:
+                target.write("".join(chunk).encode("utf-8"))
+                chunk = []
+        target.write("".join(chunk).encode("utf-8"))
+    return target if output is None else output
+
+
+def write_grid_cells_to_csv(grid_cells, output=None):
+    """
+    One line per merged range: its Excel reference and its first/last row and column.
+
+    :param grid_cells: (M, 4) array or iterable of 0-based (row, col, adjacent_row, adjacent_col)
+    :param output: Optional file path or binary file object to write to instead of memory
+    :return: BytesIO object holding the CSV, or output if it was given
+    """
+    ranges = cells_to_ranges(grid_cells)
+    lines = ["range,first_row,first_column,last_row,last_column\n"]
+    lines.extend(f"{reference},{r1},{c1},{r2},{c2}\n" for reference, (r1, c1, r2, c2) in zip(range_references(ranges), ranges.tolist()))
+    return _write_lines(lines, output)
+
+
+def write_grid_cells_to_json(grid_cells, output=None):
+    """
+    {"rows", "columns": size of the occupied area, "ranges": [[first_row, first_column, last_row, last_column], ...]}
+
+    :param grid_cells: (M, 4) array or iterable of 0-based (row, col, adjacent_row, adjacent_col)
+    :param output: Optional file path or binary file object to write to instead of memory
+    :return: BytesIO object holding the JSON, or output if it was given
+    """
+    ranges = cells_to_ranges(grid_cells)
+    document = {
+        "rows": int(ranges[:, 2].max()) if len(ranges) else 0,
+        "columns": int(ranges[:, 3].max()) if len(ranges) else 0,
+        "ranges": ranges.tolist(),
+    }
+    return _write_lines([json.dumps(document, separators=(",", ":"))], output)
+
+
+def occupied_runs(ranges):
+    """
+    Run-length encodes the cells covered by the merged ranges row by row.
+
+    :param ranges: (M, 4) array from addressing.cells_to_ranges
+    :return: (K, 3) int array of (row, first_column, length), sorted by row and column
+    """
+    if not len(ranges):
+        return np.empty((0, 3), dtype=np.int64)
+
+    # Every covered (row, column) as one sortable key; columns stay below 2^20 (Excel's limit is 16384)
+    heights = ranges[:, 2] - ranges[:, 0] + 1
+    widths = ranges[:, 3] - ranges[:, 1] + 1
+    sizes = heights * widths
+    owner = np.repeat(np.arange(len(ranges)), sizes)
+    position = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    rows = ranges[owner, 0] + position // widths[owner]
+    cols = ranges[owner, 1] + position % widths[owner]
+    keys = np.unique((rows << 20) | cols)
+
+    # A run starts wherever the key does not continue the previous one (new row or a gap)
+    starts = np.flatnonzero(np.diff(keys, prepend=keys[0] - 2) != 1)
+    lengths = np.diff(np.append(starts, len(keys)))
+    return np.column_stack((keys[starts] >> 20, keys[starts] & ((1 << 20) - 1), lengths))
+
+
+def write_grid_cells_to_rle(grid_cells, output=None):
+    """
+    One line per run of occupied cells in a row: "row,first_column,length" (1-based). Loses the
+    merge boundaries, but is the smallest description of the occupied area.
+
+    :param grid_cells: (M, 4) array or iterable of 0-based (row, col, adjacent_row, adjacent_col)
+    :param output: Optional file path or binary file object to write to instead of memory
+    :return: BytesIO object holding the runs, or output if it was given
+    """
+    runs = occupied_runs(cells_to_ranges(grid_cells)).tolist()
+    lines = ["row,first_column,length\n"]
+    lines.extend(f"{row},{col},{length}\n" for row, col, length in runs)
+    return _write_lines(lines, output)
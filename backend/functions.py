@@ -1,9 +1,23 @@
 import ezdxf
-import random
+import mmap
+import os
+import re
+import resource
+import sys
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
 from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Alignment, Border, Side
-from openpyxl.utils import get_column_letter, column_index_from_string
+from openpyxl.styles import PatternFill, Alignment, Border, Side, NamedStyle
+from openpyxl.worksheet.dimensions import ColumnDimension, SheetFormatProperties
+from xlsx_writer import write_grid_cells_to_xlsx
+from compact_export import write_grid_cells_to_csv, write_grid_cells_to_json, write_grid_cells_to_rle
+from grid_inference import infer_grid
+from grid_alignment import align_panels
+from spatial_index import GridIndex
+from addressing import as_cells
+from panel_numbering import number_panels, string_table, summary_table, SUMMARY_SHEET, STRINGS_SHEET
+from instrumentation import stage, event, collect, profiled, logger
 
 
 
@@ -17,36 +31,635 @@ def read_lwpolylines_from_dxf(file_path):
 
     :param file_path: Path to the DXF file
     :return: A list of dictionaries containing information about each LWPOLYLINE
+    :raises ValueError: If the file is not a DXF file (OSError if it cannot be read)
     """
+    # ezdxf reports a file that is not a DXF file as an IOError, like a missing one
+    if not ezdxf.is_dxf_file(file_path):
+        raise ValueError("Invalid DXF file structure: not a DXF file")
     try:
         # Load the DXF document
         doc = ezdxf.readfile(file_path)
-        # Access the modelspace where entities are typically stored
-        msp = doc.modelspace()
-        
-        # Initialize a list to hold information about all LWPOLYLINEs
-        lwpolyline_data = []
-        
-        # Iterate over all LWPOLYLINE entities in the modelspace
-        for lwpolyline in msp.query("LWPOLYLINE"):
-            # Extract vertex data as tuples of (x, y, start_width, end_width, bulge)
-            points = [(float(x), float(y)) for x, y, _, _, _ in lwpolyline]
-            
-            # Store the extracted information
-            data = {
-                "points": points,  # List of vertex tuples
-                "is_closed": lwpolyline.is_closed,  # Whether the polyline is closed
-                "layer": lwpolyline.dxf.layer,  # Layer of the polyline
-            }
-            lwpolyline_data.append(data)
+    except ezdxf.DXFStructureError as error:
+        raise ValueError(f"Invalid DXF file structure: {error}") from error
+
+    # Access the modelspace where entities are typically stored
+    msp = doc.modelspace()
+    
+    # Initialize a list to hold information about all LWPOLYLINEs
+    lwpolyline_data = []
+    
+    # Iterate over all LWPOLYLINE entities in the modelspace
+    for lwpolyline in msp.query("LWPOLYLINE"):
+        # Extract vertex data as tuples of (x, y, start_width, end_width, bulge)
+        points = [(float(x), float(y)) for x, y, _, _, _ in lwpolyline]
         
-        return lwpolyline_data
-    except IOError:
-        print("Could not read the DXF file. Please check the file path.")
-        return []
-    except ezdxf.DXFStructureError:
-        print("Invalid DXF file structure.")
-        return []
+        # Store the extracted information
+        data = {
+            "points": points,  # List of vertex tuples
+            "is_closed": lwpolyline.is_closed,  # Whether the polyline is closed
+            "layer": lwpolyline.dxf.layer,  # Layer of the polyline
+        }
+        lwpolyline_data.append(data)
+    
+    return lwpolyline_data
+
+#########################################################################################################################################################################################
+# Function to stream closed 4-vertex polylines from the ENTITIES section of a DXF
+#########################################################################################################################################################################################
+
+def iter_lwpolylines_from_dxf(file_path):
+    """
+    Streams LWPOLYLINE entities from a DXF file group-code by group-code, without building
+    an ezdxf document. Only the ENTITIES section is inspected and only closed modelspace
+    polylines with exactly 4 vertices are yielded, so memory use does not grow with the file.
+
+    :param file_path: Path to the (ASCII) DXF file
+    :return: A generator of dictionaries in the same format as read_lwpolylines_from_dxf
+    :raises ValueError: While iterating, if the file is not a DXF file (see _parse_lwpolylines);
+                        OSError if it cannot be read
+    """
+    with open(file_path, "r", encoding="utf-8", errors="replace") as dxf_file:
+        yield from _parse_lwpolylines(dxf_file)
+
+
+def _finished_panel(entity):
+    """
+    Returns the polyline dictionary for a fully collected LWPOLYLINE, or None if it cannot be a panel.
+    """
+    if entity is not None and entity["count"] == 4 and entity["flags"] & 1 \
+            and not entity["paperspace"] and len(entity["points"]) == 4:
+        return {
+            "points": entity["points"],
+            "is_closed": True,
+            "layer": entity["layer"],
+        }
+    return None
+
+
+def _parse_lwpolylines(lines, section=None):
+    """
+    The group-code state machine behind iter_lwpolylines_from_dxf.
+
+    :param lines: Iterable of DXF lines (code and value lines alternating)
+    :param section: Section the lines start in, "ENTITIES" when parsing a chunk of that section
+    :raises ValueError: If the lines have no ENTITIES section or a group value of a polyline is not a number
+    """
+    lines = iter(lines)
+    found_entities = section == "ENTITIES"
+    expect_section_name = False
+    entity = None  # State of the LWPOLYLINE currently being collected
+
+    for code in lines:
+        value = next(lines, "").strip()
+        code = code.strip()
+
+        if code == "0":
+            # A new entity (or section marker) starts, so the previous one is complete
+            panel = _finished_panel(entity)
+            if panel is not None:
+                yield panel
+            entity = None
+
+            if value == "SECTION":
+                expect_section_name = True
+            elif value == "ENDSEC":
+                section = None
+            elif value == "EOF":
+                break
+            elif value == "LWPOLYLINE" and section == "ENTITIES":
+                entity = {"points": [], "layer": "0", "flags": 0, "count": 0, "paperspace": False, "x": None}
+            continue
+
+        if expect_section_name:
+            if code == "2":
+                section = value
+                found_entities = found_entities or section == "ENTITIES"
+            expect_section_name = False
+            continue
+
+        if entity is None:
+            continue  # Skip everything that is not part of an LWPOLYLINE
+
+        if code == "10":
+            entity["x"] = float(value)
+        elif code == "20":
+            entity["points"].append((entity["x"], float(value)))
+        elif code == "8":
+            entity["layer"] = value
+        elif code == "70":
+            entity["flags"] = int(value)
+        elif code == "90":
+            entity["count"] = int(value)
+            if entity["count"] != 4:
+                entity = None  # Can never be a panel, skip the rest of the entity
+        elif code == "67":
+            entity["paperspace"] = int(value) == 1
+
+    # A chunk of the ENTITIES section can end right after an entity
+    panel = _finished_panel(entity)
+    if panel is not None:
+        yield panel
+
+    if not found_entities:
+        raise ValueError("Invalid DXF file structure: no ENTITIES section")
+
+
+#########################################################################################################################################################################################
+# Parallel ingest: split the ENTITIES section into byte ranges at LWPOLYLINE boundaries and parse them in a process pool
+#########################################################################################################################################################################################
+
+# Files smaller than this are parsed in a single process, pool startup would cost more than it saves
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024
+
+ENTITIES_START = re.compile(rb"(?:\A|\n)[ \t]*0\r?\nSECTION\r?\n[ \t]*2\r?\nENTITIES\r?\n")
+ENTITIES_END = re.compile(rb"\n[ \t]*0\r?\nENDSEC\r?\n")
+LWPOLYLINE_START = re.compile(rb"\n([ \t]*0\r?\nLWPOLYLINE\r?\n)")
+
+
+def _entities_section(data):
+    """
+    Byte range of the ENTITIES section (after its header, up to and including the newline before ENDSEC).
+
+    :raises ValueError: If the file has no ENTITIES section, i.e. is not an ASCII DXF file
+    """
+    section = ENTITIES_START.search(data)
+    if section is None:
+        raise ValueError("Invalid DXF file structure: no ENTITIES section")
+    section_end = ENTITIES_END.search(data, section.end())
+    return section.end(), section_end.start() + 1 if section_end else len(data)
+
+
+def _check_not_empty(dxf_file):
+    if os.fstat(dxf_file.fileno()).st_size == 0:
+        raise ValueError("Invalid DXF file structure: the file is empty")
+
+
+def find_entity_chunks(file_path, chunks):
+    """
+    Splits the ENTITIES section of a DXF file into at most `chunks` byte ranges that each start
+    at an LWPOLYLINE group ("  0\\nLWPOLYLINE"), so every range can be parsed on its own.
+
+    :return: List of (start, end) byte offsets
+    :raises ValueError: If the file is not a DXF file (see _entities_section)
+    """
+    with open(file_path, "rb") as dxf_file:
+        _check_not_empty(dxf_file)
+        with mmap.mmap(dxf_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start, end = _entities_section(data)
+
+            step = max(1, (end - start) // chunks)
+            boundaries = []
+            position = start
+            while position < end:
+                match = LWPOLYLINE_START.search(data, position - 1, end)  # -1 to include the preceding newline
+                if match is None:
+                    break
+                boundaries.append(match.start(1))
+                position = match.start(1) + step
+            boundaries.append(end)
+
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def _parse_entity_chunk(file_path, start, end, layers=None):
+    """
+    Worker: parses one byte range of the ENTITIES section and returns compact arrays
+    (points (M, 4, 2) float64, layer names, per-panel layer codes) instead of a list of dictionaries.
+    """
+    with open(file_path, "rb") as dxf_file:
+        with mmap.mmap(dxf_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return _parse_panels_mmap(data, start, end, layers)
+
+
+def read_panels_parallel(file_path, workers=None, parallel=None, layers=None):
+    """
+    Reads the closed 4-vertex LWPOLYLINEs of a DXF file into the array representation of polylines_to_array,
+    parsing byte ranges of the ENTITIES section in a ProcessPoolExecutor.
+
+    :param workers: Number of worker processes (defaults to the CPU count)
+    :param parallel: True/False to force or disable the process pool; by default only files of at least
+                     PARALLEL_MIN_BYTES are parsed in parallel
+    :param layers: Optional iterable of layer names; only polylines on these layers are read
+    :return: Dictionary with "points", "is_closed", "layer" and "handle" arrays
+    :raises ValueError: If the file is not a DXF file
+    """
+    if parallel is None:
+        parallel = os.path.getsize(file_path) >= PARALLEL_MIN_BYTES
+    if not parallel:
+        return read_panels_mmap(file_path, layers)
+
+    workers = workers or os.cpu_count() or 1
+    chunks = find_entity_chunks(file_path, workers * 4)
+    if not chunks:
+        return polylines_to_array([])
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        allowlist = _layer_allowlist(layers)
+        results = list(executor.map(_parse_entity_chunk, *zip(*[(file_path, start, end, allowlist) for start, end in chunks])))
+
+    # Merge the per-chunk layer tables into one
+    layer_table = {}
+    layers = []
+    for _, names, codes, _ in results:
+        remap = np.array([layer_table.setdefault(name, len(layer_table)) for name in names], dtype=np.int32)
+        layers.append(remap[codes] if len(names) else codes)
+    layer_names = np.array(list(layer_table), dtype=object)
+
+    points = np.concatenate([chunk_points for chunk_points, _, _, _ in results])
+    return {
+        "points": points,
+        "is_closed": np.ones(len(points), dtype=bool),
+        "layer": layer_names[np.concatenate(layers)] if len(layer_names) else np.array([], dtype=object),
+        "handle": np.concatenate([handles for _, _, _, handles in results]),
+    }
+
+#########################################################################################################################################################################################
+# Memory-mapped input: parse the saved upload in place and decode only the LWPOLYLINE fields we use
+#########################################################################################################################################################################################
+
+# The (code, value) pairs of one entity: every pair up to the next group with code 0. Matching whole pairs
+# matters, a value line can read "0" as well (e.g. layer 0) and would otherwise look like the next entity
+ENTITY_BODY = re.compile(rb"(?:[ \t]*(?!0\r?\n)\d+\r?\n[^\r\n]*\r?\n)*")
+GROUP = re.compile(rb"[ \t]*(\d+)\r?\n([^\r\n]*)\r?\n")
+
+
+def _layer_allowlist(layers):
+    """
+    Upper-cased layer names as bytes (DXF layer names are case-insensitive), or None to allow every layer.
+    """
+    return None if layers is None else {layer.strip().upper().encode("utf-8") for layer in layers}
+
+
+def _parse_panels_mmap(data, start, end, layers=None):
+    """
+    Parses the LWPOLYLINEs in data[start:end] (a byte range of the ENTITIES section), jumping from one
+    LWPOLYLINE to the next so other entities are never decoded.
+
+    :param data: mmap or bytes-like object holding the DXF file
+    :param layers: Optional allowlist from _layer_allowlist; polylines on other layers are skipped as soon
+                   as their layer group is read
+    :return: Tuple (points (M, 4, 2) float64, layer names, per-panel layer codes int32,
+             entity handles uint64 (0 where the entity has none))
+    """
+    layer_names = {}  # Raw layer bytes -> code, so each layer name is decoded once
+    coordinates, layer_codes, handles = [], [], []
+
+    for match in LWPOLYLINE_START.finditer(data, max(start - 1, 0), end):
+        body_start = match.end()
+        body_end = ENTITY_BODY.match(data, body_start, end).end()
+
+        count, flags, paperspace, layer, handle = 0, 0, False, b"0", 0
+        vertices = []
+        for code, value in GROUP.findall(data, body_start, body_end):
+            if code == b"10" or code == b"20":
+                vertices.append(float(value))
+            elif code == b"8":
+                layer = value.strip()
+                if layers is not None and layer.upper() not in layers:
+                    count = 0
+                    break  # Not on a panel layer
+            elif code == b"70":
+                flags = int(value)
+            elif code == b"90":
+                count = int(value)
+                if count != 4:
+                    break  # Can never be a panel
+            elif code == b"67":
+                paperspace = int(value) == 1
+            elif code == b"5":
+                handle = int(value, 16)
+
+        if count == 4 and flags & 1 and not paperspace and len(vertices) == 8:
+            coordinates.extend(vertices)
+            layer_codes.append(layer_names.setdefault(layer, len(layer_names)))
+            handles.append(handle)
+
+    return (np.array(coordinates, dtype=np.float64).reshape(-1, 4, 2),
+            [name.decode("utf-8", errors="replace") for name in layer_names],
+            np.array(layer_codes, dtype=np.int32),
+            np.array(handles, dtype=np.uint64))
+
+
+def read_panels_mmap(file_path, layers=None):
+    """
+    Reads the closed 4-vertex LWPOLYLINEs of a DXF file by memory-mapping it, so the file is never
+    copied into Python strings; only the vertex numbers, layer names and handles of LWPOLYLINEs are decoded.
+
+    :param layers: Optional iterable of layer names; only polylines on these layers are read
+
+    :return: Dictionary with "points", "is_closed", "layer" and "handle" arrays (see polylines_to_array)
+    :raises ValueError: If the file is not a DXF file, so the conversion fails instead of returning no panels
+    """
+    with open(file_path, "rb") as dxf_file:
+        _check_not_empty(dxf_file)
+        with mmap.mmap(dxf_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start, end = _entities_section(data)
+            points, layer_names, layer_codes, handles = _parse_panels_mmap(data, start, end, _layer_allowlist(layers))
+
+    return {
+        "points": points,
+        "is_closed": np.ones(len(points), dtype=bool),
+        "layer": np.array(layer_names, dtype=object)[layer_codes] if layer_names else np.array([], dtype=object),
+        "handle": handles,
+    }
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+#########################################################################################################################################################################################
+# Block-aware input: panels drawn once in a block definition and placed with INSERT (or MINSERT arrays)
+#########################################################################################################################################################################################
+
+BLOCKS_START = re.compile(rb"\n[ \t]*0\r?\nSECTION\r?\n[ \t]*2\r?\nBLOCKS\r?\n")
+BLOCK_ENTITY_START = re.compile(rb"\n[ \t]*0\r?\n(BLOCK|ENDBLK|LWPOLYLINE|INSERT)\r?\n")
+MODEL_ENTITY_START = re.compile(rb"\n[ \t]*0\r?\n(LWPOLYLINE|INSERT)\r?\n")
+
+# Blocks nested deeper than this (or referencing themselves) are ignored
+MAX_BLOCK_DEPTH = 16
+
+
+def _entity_groups(data, body_start, end):
+    """
+    The (code, value) groups of the entity whose body starts at body_start.
+    """
+    return GROUP.findall(data, body_start, ENTITY_BODY.match(data, body_start, end).end())
+
+
+def _parse_lwpolyline(groups):
+    """
+    :return: Tuple (8 vertex coordinates, layer bytes, handle) of a closed 4-vertex LWPOLYLINE, or None
+    """
+    count, flags, paperspace, layer, handle, mirrored = 0, 0, False, b"0", 0, False
+    vertices = []
+    for code, value in groups:
+        if code == b"10" or code == b"20":
+            vertices.append(float(value))
+        elif code == b"8":
+            layer = value.strip()
+        elif code == b"70":
+            flags = int(value)
+        elif code == b"90":
+            count = int(value)
+            if count != 4:
+                return None
+        elif code == b"67":
+            paperspace = int(value) == 1
+        elif code == b"5":
+            handle = int(value, 16)
+        elif code == b"230":
+            mirrored = float(value) < 0
+
+    if count == 4 and flags & 1 and not paperspace and len(vertices) == 8:
+        if mirrored:  # Extrusion (0, 0, -1): the vertices are in an object coordinate system with x flipped
+            vertices[0::2] = [-x for x in vertices[0::2]]
+        return vertices, layer, handle
+    return None
+
+
+def _parse_insert(groups):
+    """
+    :return: Dictionary with the block name, insertion point, scale, rotation (degrees), MINSERT
+             columns/rows and spacing, layer bytes, handle and whether the extrusion is (0, 0, -1)
+             ("mirrored") of an INSERT, or None for paperspace
+    """
+    insert = {"name": b"", "x": 0.0, "y": 0.0, "scale_x": 1.0, "scale_y": 1.0, "rotation": 0.0,
+              "columns": 1, "rows": 1, "column_spacing": 0.0, "row_spacing": 0.0, "layer": b"0", "handle": 0,
+              "mirrored": False}
+    for code, value in groups:
+        if code == b"2":
+            insert["name"] = value.strip()
+        elif code == b"10":
+            insert["x"] = float(value)
+        elif code == b"20":
+            insert["y"] = float(value)
+        elif code == b"41":
+            insert["scale_x"] = float(value)
+        elif code == b"42":
+            insert["scale_y"] = float(value)
+        elif code == b"50":
+            insert["rotation"] = float(value)
+        elif code == b"70":
+            insert["columns"] = max(1, int(value))
+        elif code == b"71":
+            insert["rows"] = max(1, int(value))
+        elif code == b"44":
+            insert["column_spacing"] = float(value)
+        elif code == b"45":
+            insert["row_spacing"] = float(value)
+        elif code == b"8":
+            insert["layer"] = value.strip()
+        elif code == b"5":
+            insert["handle"] = int(value, 16)
+        elif code == b"230":
+            insert["mirrored"] = float(value) < 0
+        elif code == b"67" and int(value) == 1:
+            return None
+    return insert
+
+
+def _parse_blocks(data):
+    """
+    Collects the panels (closed 4-vertex LWPOLYLINEs) and nested INSERTs of every block definition.
+
+    :return: Dictionary {block name bytes: {"base": (x, y), "points": list of 8 coordinates per panel,
+             "layers": layer bytes per panel, "inserts": list of _parse_insert dictionaries}}
+    """
+    section = BLOCKS_START.search(data)
+    if section is None:
+        return {}
+    section_end = ENTITIES_END.search(data, section.end())
+    end = section_end.start() + 1 if section_end else len(data)
+
+    blocks = {}
+    block = None
+    for match in BLOCK_ENTITY_START.finditer(data, section.end() - 1, end):
+        kind = match.group(1)
+        if kind == b"ENDBLK":
+            block = None
+            continue
+
+        groups = _entity_groups(data, match.end(), end)
+        if kind == b"BLOCK":
+            name, base = b"", [0.0, 0.0]
+            for code, value in groups:
+                if code == b"2":
+                    name = value.strip()
+                elif code == b"10":
+                    base[0] = float(value)
+                elif code == b"20":
+                    base[1] = float(value)
+            block = blocks.setdefault(name, {"base": tuple(base), "points": [], "layers": [], "inserts": []})
+        elif block is None:
+            continue
+        elif kind == b"LWPOLYLINE":
+            panel = _parse_lwpolyline(groups)
+            if panel is not None:
+                block["points"].append(panel[0])
+                block["layers"].append(panel[1])
+        else:
+            insert = _parse_insert(groups)
+            if insert is not None:
+                block["inserts"].append(insert)
+    return blocks
+
+
+def _transform_block(points, inserts):
+    """
+    Places the block-local panels of one block at every insert with array math:
+    world = insertion + rotate(scale * local + MINSERT offset), with x negated for a (0, 0, -1) extrusion.
+
+    :param points: (K, 4, 2) panel vertices relative to the block base point
+    :param inserts: List of _parse_insert dictionaries of this block
+    :return: Tuple ((N * K, 4, 2) vertices, index of the insert of every panel), N being the number of
+             placed copies (MINSERT arrays place columns * rows copies)
+    """
+    copies = [(index, column * insert["column_spacing"], row * insert["row_spacing"])
+              for index, insert in enumerate(inserts)
+              for row in range(insert["rows"]) for column in range(insert["columns"])]
+    insert_index = np.array([index for index, _, _ in copies], dtype=np.int64)
+    offsets = np.array([(dx, dy) for _, dx, dy in copies], dtype=np.float64).reshape(-1, 2)
+
+    origin = np.array([(insert["x"], insert["y"]) for insert in inserts], dtype=np.float64)[insert_index]
+    scale = np.array([(insert["scale_x"], insert["scale_y"]) for insert in inserts], dtype=np.float64)[insert_index]
+    angle = np.radians(np.array([insert["rotation"] for insert in inserts], dtype=np.float64))[insert_index]
+    cos, sin = np.cos(angle)[:, None, None], np.sin(angle)[:, None, None]
+
+    local = points[None, :, :, :] * scale[:, None, None, :] + offsets[:, None, None, :]
+    world = np.empty_like(local)
+    world[..., 0] = local[..., 0] * cos - local[..., 1] * sin + origin[:, None, None, 0]
+    world[..., 1] = local[..., 0] * sin + local[..., 1] * cos + origin[:, None, None, 1]
+    mirrored = np.array([insert["mirrored"] for insert in inserts], dtype=bool)[insert_index]
+    world[mirrored, :, :, 0] *= -1
+    return world.reshape(-1, 4, 2), np.repeat(insert_index, len(points))
+
+
+def _effective_layers(panel_layers, insert_layers):
+    """
+    Entities on layer 0 inside a block take the layer of the INSERT that places them.
+    """
+    return np.where(panel_layers == b"0", insert_layers, panel_layers)
+
+
+def _resolve_block(name, blocks, resolved, depth=0):
+    """
+    The panels of a block, including those of nested INSERTs, relative to its base point.
+    Each block is resolved once and cached in resolved.
+
+    :return: Tuple ((K, 4, 2) vertices, (K,) layer bytes)
+    """
+    if name in resolved:
+        return resolved[name]
+    empty = (np.empty((0, 4, 2), dtype=np.float64), np.array([], dtype=object))
+    block = blocks.get(name)
+    if block is None or depth > MAX_BLOCK_DEPTH:
+        return empty
+    resolved[name] = empty  # Guards against blocks that insert themselves
+
+    points = [np.array(block["points"], dtype=np.float64).reshape(-1, 4, 2)]
+    layers = [np.array(block["layers"], dtype=object)]
+    for child, child_inserts in _group_inserts(block["inserts"]).items():
+        child_points, child_layers = _resolve_block(child, blocks, resolved, depth + 1)
+        if len(child_points):
+            placed, insert_index = _transform_block(child_points, child_inserts)
+            insert_layers = np.array([insert["layer"] for insert in child_inserts], dtype=object)[insert_index]
+            points.append(placed)
+            layers.append(_effective_layers(np.tile(child_layers, len(placed) // len(child_points)), insert_layers))
+
+    result = (np.concatenate(points) - np.array(block["base"]), np.concatenate(layers))
+    resolved[name] = result
+    return result
+
+
+def _group_inserts(inserts):
+    grouped = {}
+    for insert in inserts:
+        grouped.setdefault(insert["name"], []).append(insert)
+    return grouped
+
+
+def read_panels_blocks(file_path, layers=None):
+    """
+    Reads the panels of a DXF file including those placed as block references: every block definition is
+    resolved once (nested blocks included) and its panels are placed at all of its INSERTs in one batched
+    transform, instead of exploding every reference.
+
+    :param layers: Optional iterable of layer names; only panels on these layers are read. A panel on layer 0
+                   inside a block is on the layer of its INSERT
+    :return: Dictionary with "points", "is_closed", "layer" and "handle" arrays (see polylines_to_array);
+             panels placed by an INSERT get the handle of the INSERT
+    :raises ValueError: If the file is not a DXF file
+    """
+    allowlist = _layer_allowlist(layers)
+    with open(file_path, "rb") as dxf_file:
+        _check_not_empty(dxf_file)
+        with mmap.mmap(dxf_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start, end = _entities_section(data)
+
+            blocks = _parse_blocks(data)
+            coordinates, panel_layers, handles = [], [], []
+            inserts = []
+            for match in MODEL_ENTITY_START.finditer(data, start - 1, end):
+                groups = _entity_groups(data, match.end(), end)
+                if match.group(1) == b"LWPOLYLINE":
+                    panel = _parse_lwpolyline(groups)
+                    if panel is not None and (allowlist is None or panel[1].upper() in allowlist):
+                        coordinates.extend(panel[0])
+                        panel_layers.append(panel[1])
+                        handles.append(panel[2])
+                else:
+                    insert = _parse_insert(groups)
+                    if insert is not None and insert["name"] in blocks:
+                        inserts.append(insert)
+
+    points = [np.array(coordinates, dtype=np.float64).reshape(-1, 4, 2)]
+    layer_values = [np.array(panel_layers, dtype=object)]
+    handle_values = [np.array(handles, dtype=np.uint64)]
+
+    resolved = {}
+    for name, block_inserts in _group_inserts(inserts).items():
+        block_points, block_layers = _resolve_block(name, blocks, resolved)
+        if allowlist is not None:
+            # Decide per block panel and per insert instead of per placed panel: a panel on layer 0 is kept
+            # if its insert's layer is allowed, any other panel if its own layer is allowed
+            on_layer_zero = block_layers == b"0"
+            panel_allowed = np.array([layer.upper() in allowlist for layer in block_layers], dtype=bool)
+            block_inserts = [insert for insert in block_inserts
+                             if panel_allowed.any() or (on_layer_zero.any() and insert["layer"].upper() in allowlist)]
+        if not len(block_points) or not block_inserts:
+            continue
+
+        placed, insert_index = _transform_block(block_points, block_inserts)
+        copies = len(placed) // len(block_points)
+        insert_layers = np.array([insert["layer"] for insert in block_inserts], dtype=object)[insert_index]
+        placed_layers = _effective_layers(np.tile(block_layers, copies), insert_layers)
+        placed_handles = np.array([insert["handle"] for insert in block_inserts], dtype=np.uint64)[insert_index]
+
+        if allowlist is not None:
+            insert_allowed = np.array([insert["layer"].upper() in allowlist for insert in block_inserts], dtype=bool)
+            keep = np.where(np.tile(on_layer_zero, copies), insert_allowed[insert_index], np.tile(panel_allowed, copies))
+            placed, placed_layers, placed_handles = placed[keep], placed_layers[keep], placed_handles[keep]
+        points.append(placed)
+        layer_values.append(placed_layers)
+        handle_values.append(placed_handles)
+
+    points = np.concatenate(points)
+    # Decode each layer name once
+    layer_bytes, layer_codes = np.unique(np.concatenate(layer_values), return_inverse=True)
+    layer_names = np.array([layer.decode("utf-8", errors="replace") for layer in layer_bytes], dtype=object)
+    return {
+        "points": points,
+        "is_closed": np.ones(len(points), dtype=bool),
+        "layer": layer_names[layer_codes] if len(layer_names) else np.array([], dtype=object),
+        "handle": np.concatenate(handle_values),
+    }
+
 
 #########################################################################################################################################################################################
 # Function to check if the selected polyline is a rectangle, if true, it will likely be a panel
@@ -180,7 +793,7 @@ def mirror_points_across_x_axis(lwpolylines):
         for point in polyline["points"]:
             max_y = max(max_y, point[1])
 
-    print(f"Maximum y value: {max_y}")
+    logger.debug(f"Maximum y value: {max_y}")
 
     # Mirror points across x-axis and make y positive
     for polyline in lwpolylines:
@@ -192,22 +805,6 @@ def mirror_points_across_x_axis(lwpolylines):
     return lwpolylines
 
 
-#########################################################################################################################################################################################
-# Function to convert numeric column index to Excel-style column label
-#########################################################################################################################################################################################
-
-
-def column_index_to_label(index):
-    """
-    Converts a numeric column index (0-based) to an Excel-style column label.
-    For example, 0 -> 'A', 25 -> 'Z', 26 -> 'AA'.
-    """
-    label = ""
-    while index >= 0:
-        label = chr(index % 26 + ord('A')) + label
-        index = index // 26 - 1
-    return label
-
 #########################################################################################################################################################################################
 # Function to find the grid cell for a given center and orientation
 #########################################################################################################################################################################################
@@ -216,6 +813,9 @@ def find_grid_cell(cellcenter, grid_origin, cell_width, cell_height, grid_rows,
     """
     Finds the grid cell where the given cellcenter falls, and also returns the adjacent cell
     based on the orientation of the rectangle (horizontal or vertical).
+
+    :return: Tuple of 0-based (row, col) cells (current cell, adjacent cell); the adjacent cell is None
+             at the edge of the grid, both are None when the cellcenter is out of grid bounds
     """
     x_center, y_center = cellcenter
     x_origin, y_origin = grid_origin
@@ -226,29 +826,23 @@ def find_grid_cell(cellcenter, grid_origin, cell_width, cell_height, grid_rows,
 
     # Check if the indices are within the grid bounds
     if 0 <= col_idx < grid_columns and 0 <= row_idx < grid_rows:
-        # Get the column label using the column index
-        column_label = column_index_to_label(col_idx)
-        # Excel-style row is 1-based (e.g., 1 for the first row, 2 for the second row)
-        row_label = row_idx + 1  # Row starts at 1, not 0
-
         # Current cell is the one where the cellcenter falls
-        current_cell = f"{column_label}{row_label}"
-        
+        current_cell = (row_idx, col_idx)
+
         # Based on the orientation, find the adjacent cell
         if orientation == "Horizontal":
-            # For horizontal rectangles, the adjacent cell is directly below
+            # For horizontal rectangles, the adjacent cell is directly to the right
             if row_idx + 1 < grid_rows:
-                adjacent_column_label = column_index_to_label(col_idx + 1)
-                adjacent_cell = f"{adjacent_column_label}{row_label}"
+                adjacent_cell = (row_idx, col_idx + 1)
             else:
-                adjacent_cell = None  # No cell below if it's at the edge of the grid
+                adjacent_cell = None  # No adjacent cell if it's at the edge of the grid
         elif orientation == "Vertical":
-            # For vertical rectangles, the adjacent cell is directly to the right
+            # For vertical rectangles, the adjacent cell is directly below
             if col_idx + 1 < grid_columns:
-                adjacent_cell = f"{column_label}{row_label + 1}"
+                adjacent_cell = (row_idx + 1, col_idx)
             else:
-                adjacent_cell = None  # No cell to the right if it's at the edge of the grid
-        
+                adjacent_cell = None  # No adjacent cell if it's at the edge of the grid
+
         return current_cell, adjacent_cell
     else:
         return None, None  # Cellcenter is out of grid bounds
@@ -259,69 +853,77 @@ def find_grid_cell(cellcenter, grid_origin, cell_width, cell_height, grid_rows,
 # Process the polyline data and write to the Excel file
 #########################################################################################################################################################################################
 
-def process_polylines_to_excel(lwpolylines, grid_origin, cell_width, cell_height, grid_rows, grid_columns):
+def process_polylines_to_excel(lwpolylines, grid_origin, cell_width, cell_height, grid_rows, grid_columns, writer="openpyxl", output=None):
+
+    grid_cells = []
+    polyline_numbers = []
+    for idx, polyline in enumerate(lwpolylines, start=1):
+        properties = check_rectangle_properties(polyline)
+        
+        if properties:
+            orientation, center, avg_height, avg_width, cellcenter = properties
+            current_cell, adjacent_cell = find_grid_cell(cellcenter, grid_origin, cell_width, cell_height, grid_rows, grid_columns, orientation)
+
+            if adjacent_cell is not None:
+                grid_cells.append(current_cell + adjacent_cell)
+                polyline_numbers.append(idx)
+            else:
+                event("out_of_grid", polyline=idx, cellcenter=cellcenter)
+        else:
+            event("not_a_rectangle", polyline=idx)
+
+    # Same collision check as the array pipeline: a panel on cells that are already taken is left out
+    grid_cells = np.array(grid_cells, dtype=np.int64).reshape(-1, 4)
+    index = GridIndex(grid_cells[:, 0], grid_cells[:, 1], grid_cells[:, 2], grid_cells[:, 3], grid_columns)
+    for panel, other, cell in index.collisions:
+        event("collision", polyline=polyline_numbers[panel], other=polyline_numbers[other], cell=cell)
+    if index.collisions:
+        logger.warning(f"{len(index.collisions)} panels overlap other panels in the grid and are not mapped")
+
+    return EXCEL_WRITERS[writer](grid_cells[index.accepted], output)
+
+
+#########################################################################################################################################################################################
+# Write a list of (cell1, cell2) merges to the Excel file
+#########################################################################################################################################################################################
+
+def write_grid_cells_to_excel(grid_cells, output=None):
+    """
+    Writes the cells of every panel as a merged, filled and bordered range holding the panel number,
+    plus the strings and summary sheets (see panel_numbering).
+
+    :param grid_cells: (M, 4) array or iterable of 0-based (row, col, adjacent_row, adjacent_col)
+    :param output: Optional file path or binary file object to save the workbook to instead of memory
+    :return: BytesIO object holding the workbook, or output if it was given
+    """
+
+    numbering = number_panels(grid_cells)
+    ranges = numbering["ranges"]
 
     # Create a new workbook and select the active worksheet
     wb = Workbook()
     ws = wb.active
     ws.title = "Grid Cells"
 
-    # Set a uniform column width and row height
-    uniform_size = 15  # Adjust as needed
-    for col in range(1, 2000):  # Assuming up to column AX (adjust range if needed)
-        ws.column_dimensions[get_column_letter(col)].width = 3
-    for row in range(1, 2000):  # Assuming up to row 100 (adjust range if needed)
-        ws.row_dimensions[row].height = 14.5
+    # Uniform row height as the sheet default and one column width entry for the occupied columns,
+    # instead of a dimension per row and column of a fixed 2000 x 2000 range
+    ws.sheet_format = SheetFormatProperties(defaultRowHeight=PANEL_ROW_HEIGHT, customHeight=True)
+    max_col = int(ranges[:, 3].max()) if len(ranges) else 0
+    if max_col:
+        ws.column_dimensions["A"] = ColumnDimension(ws, index="A", min=1, max=max_col, width=PANEL_COLUMN_WIDTH, customWidth=True)
 
     # Define styles
-    light_blue_fill = PatternFill(start_color="ADD8E6", end_color="ADD8E6", fill_type="solid")
-    thin_border = Border(
-        left=Side(style="thin"),
-        right=Side(style="thin"),
-        top=Side(style="thin"),
-        bottom=Side(style="thin")
-    )
+    panel_style, border_style = panel_styles(wb)
 
-    for idx, polyline in enumerate(lwpolylines, start=1):
-        properties = check_rectangle_properties(polyline)
-        
-        if properties:
-            orientation, center, avg_height, avg_width, cellcenter = properties
-            grid_cell = find_grid_cell(cellcenter, grid_origin, cell_width, cell_height, grid_rows, grid_columns, orientation)
-            
-            if grid_cell:
-                cell1, cell2 = grid_cell  # Unpack the two adjacent cell references
-                
-                # Merge the two cells
-                ws.merge_cells(f"{cell1}:{cell2}")
-                merged_cell = ws[cell1]
-                
-                # Apply formatting
-                merged_cell.fill = light_blue_fill
-                merged_cell.alignment = Alignment(horizontal="center", vertical="center")
-                #merged_cell.value = f"{1}"  # Label merged cell
-                
-                # Apply borders around the entire merged range
-                start_col = "".join(filter(str.isalpha, cell1))  # Extract column letters
-                start_row = int("".join(filter(str.isdigit, cell1)))  # Extract row number
-                end_col = "".join(filter(str.isalpha, cell2))  # Extract column letters
-                end_row = int("".join(filter(str.isdigit, cell2)))  # Extract row number
-
-                # Convert column letters to numbers using column_index_from_string
-                start_col_num = column_index_from_string(start_col)
-                end_col_num = column_index_from_string(end_col)
-
-                # Apply borders only to the outermost cells in the merged range
-                for row in range(start_row, end_row + 1):
-                    for col in range(start_col_num, end_col_num + 1):
-                        cell = ws.cell(row=row, column=col)
-                        cell.border = thin_border  # Apply border to every cell in the merged range
+    for bounds, number in zip(ranges.tolist(), numbering["numbers"].tolist()):
+        merge_panel_cells(ws, *bounds, panel_style, border_style, number)
+    write_summary_sheets(wb, numbering)
 
-            else:
-                print(f"LWPOLYLINE {idx}: Cellcenter {cellcenter} is out of grid bounds.")
-        else:
-            print(f"LWPOLYLINE {idx}: Not a rectangle")
-        # Save to in-memory buffer
+    if output is not None:
+        wb.save(output)
+        return output
+
+    # Save to in-memory buffer
     
     excel_io = BytesIO()
     wb.save(excel_io)        
@@ -339,66 +941,459 @@ def process_polylines_to_excel(lwpolylines, grid_origin, cell_width, cell_height
 
 
 #########################################################################################################################################################################################
-# Function to get averagge cell height and width
+# Merge / unmerge the cells of one panel in an openpyxl worksheet
 #########################################################################################################################################################################################
 
-def calculate_avg_dimensions(valid_rectangles):
+# Named cell styles shared by all panels (also used by the XML writer)
+PANEL_STYLE = "Panel"
+PANEL_BORDER_STYLE = "Panel border"
+PANEL_COLUMN_WIDTH = 3
+PANEL_ROW_HEIGHT = 14.5
+
+# Style objects of the named styles, built once at import and shared by every workbook (openpyxl copies
+# them into each workbook's style tables, they are never modified)
+PANEL_BORDER = Border(
+    left=Side(style="thin"),
+    right=Side(style="thin"),
+    top=Side(style="thin"),
+    bottom=Side(style="thin")
+)
+PANEL_FILL = PatternFill(start_color="ADD8E6", end_color="ADD8E6", fill_type="solid")
+PANEL_ALIGNMENT = Alignment(horizontal="center", vertical="center", shrink_to_fit=True)  # Long panel numbers shrink instead of showing ###
+
+
+def panel_styles(wb):
+    """
+    Registers the named styles used for every panel in the workbook (once), so each styled cell refers
+    to a shared style instead of carrying its own fill, border and alignment objects.
+
+    :return: Tuple (panel style name, border style name): the panel style (fill, border, centered) is
+             used for the top-left cell of a merged range, the border style for the rest of its edge
+    """
+    if PANEL_STYLE not in wb.named_styles:
+        wb.add_named_style(NamedStyle(name=PANEL_STYLE, fill=PANEL_FILL, border=PANEL_BORDER, alignment=PANEL_ALIGNMENT))
+    if PANEL_BORDER_STYLE not in wb.named_styles:
+        wb.add_named_style(NamedStyle(name=PANEL_BORDER_STYLE, border=PANEL_BORDER))
+    return PANEL_STYLE, PANEL_BORDER_STYLE
+
+
+def _range_edge(start_row, start_col, end_row, end_col):
+    """
+    The cells on the edge of a merged range; interior cells are hidden by the merge and need no border.
+    """
+    for row in range(start_row, end_row + 1):
+        if row in (start_row, end_row):
+            columns = range(start_col, end_col + 1)
+        else:
+            columns = sorted({start_col, end_col})
+        for col in columns:
+            yield row, col
+
+
+def merge_panel_cells(ws, start_row, start_col, end_row, end_col, panel_style, border_style, number=None):
+    """
+    Merges the range (1-based bounds, see addressing.cells_to_ranges), gives the merged cell the panel
+    style and borders the edge of the range.
+
+    :param panel_style, border_style: Style names from panel_styles
+    :param number: Optional panel number written into the merged cell
+    """
+    # Merge the two cells
+    ws.merge_cells(start_row=start_row, start_column=start_col, end_row=end_row, end_column=end_col)
+    for row, col in _range_edge(start_row, start_col, end_row, end_col):
+        ws.cell(row=row, column=col).style = border_style
+    merged_cell = ws.cell(row=start_row, column=start_col)
+    merged_cell.style = panel_style
+    merged_cell.value = number  # Label merged cell
+
+
+def write_summary_sheets(wb, numbering):
+    """
+    Adds (or replaces) the strings sheet and the summary sheet with the per-row counts and totals.
+
+    :param numbering: Result of panel_numbering.number_panels
+    """
+    for title, table in ((STRINGS_SHEET, string_table(numbering)), (SUMMARY_SHEET, summary_table(numbering))):
+        if title in wb.sheetnames:
+            del wb[title]
+        ws = wb.create_sheet(title)
+        for row in table:
+            ws.append(row)
+
+
+#########################################################################################################################################################################################
+# Array pipeline: read the panels with any reader, then validate, infer the grid, move, mirror and map to grid cells
+#########################################################################################################################################################################################
+
+def read_panels(file_path, reader="mmap", layers=None):
+    """
+    Reads the panels of a DXF file into the array representation of polylines_to_array.
+
+    :param reader: "mmap", "parallel", "blocks", "stream" or "ezdxf" (see master_function)
+    :param layers: Optional iterable of layer names to read panels from. The mmap, parallel and blocks
+                   readers skip other layers while scanning, for stream and ezdxf the panels are filtered afterwards
+    """
+    if reader == "mmap":
+        return read_panels_mmap(file_path, layers)
+    elif reader == "parallel":
+        return read_panels_parallel(file_path, layers=layers)
+    elif reader == "blocks":
+        return read_panels_blocks(file_path, layers)
+
+    if reader == "stream":
+        panels = polylines_to_array(iter_lwpolylines_from_dxf(file_path))
+    elif reader == "ezdxf":
+        panels = polylines_to_array(read_lwpolylines_from_dxf(file_path))
+    else:
+        raise ValueError(f"Unknown reader: {reader}")
+    if layers is not None:
+        allowlist = {layer.strip().upper() for layer in layers}
+        panels = select_panels(panels, np.array([layer.upper() in allowlist for layer in panels["layer"]], dtype=bool))
+    return panels
+
+
+def map_panels_to_cells(panels, grid_origin, grid_rows, grid_columns):
+    """
+    Runs the array pipeline from alignment and validation up to the grid cell assignment.
+
+    :param panels: Array dictionary from polylines_to_array / read_panels_mmap / read_panels_parallel
+    :return: Dictionary with
+             alignment: Orientation clusters found by align_panels; rotated clusters have a pivot
+             valid: (N,) bool mask of the panels that are rectangles
+             grid: infer_grid result for the valid rectangles
+             offset: (min_x, min_y, height) used to move and mirror the valid rectangles
+             points: moved and mirrored vertices of the valid rectangles
+             rows, cols, adjacent_rows, adjacent_cols: 0-based cells of every valid rectangle
+             mapped: bool mask over the valid rectangles that got their cells (in the grid, no overlap)
+    """
+    # Rotate arrays built at an azimuth into the axis-aligned frame, the following steps assume it
+    with stage("align") as span:
+        aligned, alignment = align_panels(panels["points"])
+        span["entities"] = len(aligned)
+    for cluster in alignment:
+        if cluster["pivot"] is not None:
+            logger.info(f"Rotated {cluster['panels']} panels by {-cluster['angle']:.2f} degrees")
+
+    # Step 2: Filter for valid rectangles
+    with stage("validate") as span:
+        valid = validate_rectangle_array(dict(panels, points=aligned))
+        points = aligned[valid]
+        span["entities"] = len(valid)
+    event("not_a_rectangle", int((~valid).sum()))
+
+    # Deterministic cell size from all rectangles
+    with stage("grid_inference") as span:
+        grid = infer_grid(points)
+        avg_cell = grid["cell_size"]
+        span["entities"] = len(points)
+    logger.info(f"Inferred cell size {avg_cell:.1f} (confidence {grid['confidence']:.2f})")
+
+    # Step 3 and 4: Move to the origin and mirror across the x-axis
+    with stage("move") as span:
+        min_xy = points.reshape(-1, 2).min(axis=0).tolist() if len(points) else [0.0, 0.0]
+        points = move_points_to_origin_array(points)
+        span["entities"] = len(points)
+    with stage("mirror") as span:
+        height = float(points[..., 1].max()) if len(points) else 0.0
+        points = mirror_points_across_x_axis_array(points)
+        span["entities"] = len(points)
+    offset = (min_xy[0], min_xy[1], height)
+
+    # Step 5: Map every panel to its grid cells
+    with stage("grid_map") as span:
+        is_vertical, center, avg_height, avg_width, cellcenters = check_rectangle_properties_array(points)
+        rows, cols, adjacent_rows, adjacent_cols, in_grid, has_adjacent = find_grid_cells_array(
+            cellcenters, is_vertical, grid_origin, avg_cell, avg_cell, grid_rows, grid_columns)
+
+        mapped = in_grid & has_adjacent
+        for idx in np.flatnonzero(~mapped).tolist():
+            event("out_of_grid", polyline=idx + 1, cellcenter=tuple(cellcenters[idx].tolist()))
+
+        # Panels landing on cells that are already taken would produce overlapping merges, keep the first one
+        index = GridIndex(rows[mapped], cols[mapped], adjacent_rows[mapped], adjacent_cols[mapped], grid_columns)
+        for panel, other, cell in index.collisions:
+            event("collision", panel=panel, other=other, cell=cell)
+        if index.collisions:
+            logger.warning(f"{len(index.collisions)} panels overlap other panels in the grid and are not mapped")
+        mapped[np.flatnonzero(mapped)[~index.accepted]] = False
+        span["entities"] = len(points)
+
+    return {
+        "alignment": alignment,
+        "valid": valid,
+        "grid": grid,
+        "offset": offset,
+        "points": points,
+        "rows": rows,
+        "cols": cols,
+        "adjacent_rows": adjacent_rows,
+        "adjacent_cols": adjacent_cols,
+        "mapped": mapped,
+    }
+
+
+# Available Excel writer backends: "openpyxl" builds the full workbook object model, "xml" streams the sheet XML;
+# "csv", "json" and "rle" are compact exports of the same merges for tools that do not read xlsx (see compact_export)
+EXCEL_WRITERS = {
+    "openpyxl": write_grid_cells_to_excel,
+    "xml": write_grid_cells_to_xlsx,
+    "csv": write_grid_cells_to_csv,
+    "json": write_grid_cells_to_json,
+    "rle": write_grid_cells_to_rle,
+}
+
+# Version of the conversion output, hashed into the result cache keys (see app.py). Bump it whenever a change
+# to the pipeline or a writer changes the output for the same drawing, so cached results of older versions
+# are not served after an upgrade
+OUTPUT_VERSION = 1
+
+# File extension and MIME type of the output of every writer
+OUTPUT_FORMATS = {
+    "openpyxl": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "xml": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": ("csv", "text/csv"),
+    "json": ("json", "application/json"),
+    "rle": ("csv", "text/csv"),
+}
+
+
+#########################################################################################################################################################################################
+# Array-backed panel representation: the same steps as above, run as batched NumPy operations
+#########################################################################################################################################################################################
+
+def polylines_to_array(lwpolylines):
+    """
+    Packs polylines into an array-backed representation. Polylines that do not have exactly
+    4 vertices can never be a panel and are dropped.
+
+    :param lwpolylines: Iterable of polyline dictionaries (see read_lwpolylines_from_dxf)
+    :return: Dictionary with "points" (N, 4, 2) float64, "is_closed" (N,) bool and "layer" (N,) object arrays
     """
-    Selects 10 random rectangles from lwpolylines and calculates the average long and short side.
+    points, is_closed, layers = [], [], []
+    for polyline in lwpolylines:
+        if len(polyline["points"]) != 4:
+            continue
+        points.append(polyline["points"])
+        is_closed.append(polyline["is_closed"])
+        layers.append(polyline["layer"])
+
+    return {
+        "points": np.array(points, dtype=np.float64).reshape(-1, 4, 2),
+        "is_closed": np.array(is_closed, dtype=bool),
+        "layer": np.array(layers, dtype=object),
+    }
 
-    :param lwpolylines: List of valid rectangle polylines (each with 4 points).
-    :return: Tuple (avg_long_side, avg_short_side)
+
+def select_panels(panels, mask):
+    """
+    Returns the panels selected by a boolean mask (or index array) as a new array dictionary.
     """
-    if not valid_rectangles:
-        return (0, 0)  # Return (0,0) if no rectangles exist
+    return {key: values[mask] for key, values in panels.items()}
 
-    # Select 10 random rectangles (or all if fewer than 10)
-    sampled_rectangles = random.sample(valid_rectangles, min(10, len(valid_rectangles)))
 
-    total_long_side = 0
-    total_short_side = 0
+def _round_like_python(values, ndigits=1):
+    """
+    np.round rounds exact ties differently from Python's round(), so the (rare) near-tie values
+    are rounded with round() to keep the results identical to validate_rectangle.
+    """
+    rounded = np.round(values, ndigits)
+    scaled = values * 10 ** ndigits
+    ties = np.abs(np.abs(scaled - np.floor(scaled)) - 0.5) < 1e-6
+    if ties.any():
+        rounded[ties] = [round(value, ndigits) for value in values[ties].tolist()]
+    return rounded
 
-    for polyline in sampled_rectangles:
-        points = polyline["points"]
 
-        # Extract min/max x and y values
-        min_x = min(p[0] for p in points)
-        max_x = max(p[0] for p in points)
-        min_y = min(p[1] for p in points)
-        max_y = max(p[1] for p in points)
+def validate_rectangle_array(panels):
+    """
+    Vectorized validate_rectangle: checks the dot products of consecutive edge vectors of all panels at once.
+
+    :param panels: Array dictionary from polylines_to_array
+    :return: (N,) bool mask, True for rectangles
+    """
+    points = panels["points"]
+    # vectors[:, i] = points[:, i] - points[:, i - 1], ensuring loop closure with points[:, 0]
+    vectors = _round_like_python(points - np.roll(points, 1, axis=1))
+    next_vectors = np.roll(vectors, -1, axis=1)
+    dot_products = vectors[..., 0] * next_vectors[..., 0] + vectors[..., 1] * next_vectors[..., 1]
 
-        # Calculate width and height
-        width = max_x - min_x
-        height = max_y - min_y
+    return panels["is_closed"] & np.all(dot_products == 0, axis=1)
 
-        # Assign long and short sides correctly
-        long_side = max(width, height)
-        short_side = min(width, height)
 
-        total_long_side += long_side
-        total_short_side += short_side
+def check_rectangle_properties_array(points):
+    """
+    Vectorized check_rectangle_properties.
 
-    # Compute averages
-    avg_long_side = (total_long_side / len(sampled_rectangles))*0
-    avg_short_side = (total_short_side / len(sampled_rectangles))*1.01411
+    :param points: (N, 4, 2) vertex array
+    :return: Tuple (is_vertical, center, average_height, average_width, cellcenter)
+             is_vertical: (N,) bool, True for 'Vertical' and False for 'Horizontal'
+             center, cellcenter: (N, 2) arrays
+             average_height, average_width: (N,) arrays
+    """
+    min_xy = points.min(axis=1)
+    max_xy = points.max(axis=1)
+    min_x, min_y = min_xy[:, 0], min_xy[:, 1]
+    max_x, max_y = max_xy[:, 0], max_xy[:, 1]
 
-    return avg_long_side, avg_short_side
+    x_diff = max_x - min_x
+    y_diff = max_y - min_y
+
+    x_center = (min_x + max_x) / 2
+    y_center = (min_y + max_y) / 2
+    center = np.column_stack((x_center, y_center))
+
+    is_vertical = y_diff > x_diff
+    cellcenter = np.where(
+        is_vertical[:, None],
+        np.column_stack((x_center, (max_y - ((max_y - y_center) / 2)))),
+        np.column_stack(((max_x - ((max_x - x_center) / 2)), y_center)),
+    )
+
+    return is_vertical, center, y_diff, x_diff, cellcenter
+
+
+def move_points_to_origin_array(points):
+    """
+    Vectorized move_polylines_to_origin, returns a shifted copy of the (N, 4, 2) vertex array.
+    """
+    if not len(points):
+        return points.copy()
+    return points - points.reshape(-1, 2).min(axis=0)
+
+
+def mirror_points_across_x_axis_array(points):
+    """
+    Vectorized mirror_points_across_x_axis, returns a mirrored copy of the (N, 4, 2) vertex array.
+    """
+    mirrored = points.copy()
+    if not len(points):
+        return mirrored
+    mirrored[..., 1] = np.abs(points[..., 1] - points[..., 1].max())
+    return mirrored
+
+
+def centers_to_cells(centers, grid_origin, cell_width, cell_height, grid_rows, grid_columns):
+    """
+    Maps an array of points to the 0-based grid cells they fall in, in one call.
+
+    :param centers: (N, 2) array of x, y
+    :return: Tuple (rows, cols, in_grid) of (N,) arrays; in_grid is False for points outside the grid
+    """
+    x_origin, y_origin = grid_origin
+
+    cols = np.floor_divide(centers[:, 0] - x_origin, cell_width).astype(np.int64)
+    rows = np.floor_divide(centers[:, 1] - y_origin, cell_height).astype(np.int64)
+    in_grid = (cols >= 0) & (cols < grid_columns) & (rows >= 0) & (rows < grid_rows)
+    return rows, cols, in_grid
+
+
+def find_grid_cells_array(cellcenters, is_vertical, grid_origin, cell_width, cell_height, grid_rows, grid_columns):
+    """
+    Vectorized find_grid_cell: the cell and adjacent cell of every panel as 0-based integer indices.
+
+    :return: Tuple (rows, cols, adjacent_rows, adjacent_cols, in_grid, has_adjacent)
+             in_grid: (N,) bool, False where find_grid_cell returns (None, None)
+             has_adjacent: (N,) bool, False where find_grid_cell returns no adjacent cell
+    """
+    rows, cols, in_grid = centers_to_cells(cellcenters, grid_origin, cell_width, cell_height, grid_rows, grid_columns)
+
+    # Horizontal panels span to the right, vertical panels span downwards (same bounds checks as find_grid_cell)
+    adjacent_rows = np.where(is_vertical, rows + 1, rows)
+    adjacent_cols = np.where(is_vertical, cols, cols + 1)
+    has_adjacent = np.where(is_vertical, cols + 1 < grid_columns, rows + 1 < grid_rows)
+
+    return rows, cols, adjacent_rows, adjacent_cols, in_grid, has_adjacent
+
+
+def stack_grid_cells(rows, cols, adjacent_rows, adjacent_cols):
+    """
+    Stacks 0-based integer cell indices into the (M, 4) grid_cells array the writers in EXCEL_WRITERS take.
+    """
+    return as_cells(np.column_stack((rows, cols, adjacent_rows, adjacent_cols)))
 
 
 #########################################################################################################################################################################################
 # Master function, gets called to call all the above functions
 #########################################################################################################################################################################################
 
-def master_function(file_path, grid_origin, grid_rows, grid_columns):
+def master_function(file_path, grid_origin, grid_rows, grid_columns, reader="stream", pipeline="array", writer="openpyxl",
+                    output=None, layers=None):
+    """
+    Converts the panels in a DXF file to an Excel grid.
+
+    :param reader: "stream" to use the streaming ENTITIES reader, "ezdxf" to load the full document
+                   with ezdxf (slower, kept to validate the streaming reader against), "parallel" to parse
+                   large files in a process pool (see read_panels_parallel), "mmap" to parse the file in place
+                   (see read_panels_mmap), "blocks" to also read panels placed as block references (see read_panels_blocks)
+    :param pipeline: "array" to run the rectangle steps as batched NumPy operations, "dict" for the
+                     original per-polyline functions (both infer the cell size with grid_inference.infer_grid)
+    :param writer: Excel writer backend, "openpyxl" or "xml", or a compact export "csv", "json" or "rle" (see EXCEL_WRITERS)
+    :param output: Optional file path or binary file object the workbook is written to while it is generated;
+                   without it the workbook is returned as a BytesIO object
+    :param layers: Optional iterable of layer names; only panels on these layers are converted
+    """
+
+    if writer not in EXCEL_WRITERS:
+        raise ValueError(f"Unknown writer: {writer}")
     
+    if pipeline == "array":
+        # Step 1: Read all polylones from dxf
+        with stage("read") as span:
+            panels = read_panels(file_path, reader, layers)
+            span["entities"] = len(panels["points"])
+
+        mapping = map_panels_to_cells(panels, grid_origin, grid_rows, grid_columns)
+        mapped = mapping["mapped"]
+        rows, cols = mapping["rows"], mapping["cols"]
+        adjacent_rows, adjacent_cols = mapping["adjacent_rows"], mapping["adjacent_cols"]
+
+        # Step 6: Write the grid cells to Excel
+        with stage("write") as span:
+            excel_io = EXCEL_WRITERS[writer](stack_grid_cells(
+                rows[mapped], cols[mapped], adjacent_rows[mapped], adjacent_cols[mapped]), output)
+            span["entities"] = int(mapped.sum())
+
+        logger.debug(f"master_function returning object of type: {type(excel_io)}")
+        return excel_io
+    elif pipeline != "dict":
+        raise ValueError(f"Unknown pipeline: {pipeline}")
 
     # Step 1: Read all polylones from dxf
-    lwpolylines = read_lwpolylines_from_dxf(file_path)
-    
+    if reader == "stream":
+        lwpolylines = iter_lwpolylines_from_dxf(file_path)
+    elif reader == "ezdxf":
+        lwpolylines = read_lwpolylines_from_dxf(file_path)
+    elif reader in ("parallel", "mmap", "blocks"):
+        raise ValueError(f"The {reader} reader returns arrays and needs pipeline=\"array\"")
+    else:
+        raise ValueError(f"Unknown reader: {reader}")
+    if layers is not None:
+        allowlist = {layer.strip().upper() for layer in layers}
+        lwpolylines = (polyline for polyline in lwpolylines if polyline["layer"].upper() in allowlist)
+
+    # Same alignment as the array pipeline (see map_panels_to_cells); only 4-vertex polylines can be panels
+    with stage("align") as span:
+        lwpolylines = list(lwpolylines)
+        quads = [polyline for polyline in lwpolylines if len(polyline["points"]) == 4]
+        aligned, alignment = align_panels(np.array([polyline["points"] for polyline in quads], dtype=np.float64).reshape(-1, 4, 2))
+        if any(cluster["pivot"] is not None for cluster in alignment):
+            for polyline, points in zip(quads, aligned.tolist()):
+                polyline["points"] = [tuple(point) for point in points]
+        span["entities"] = len(lwpolylines)
+    for cluster in alignment:
+        if cluster["pivot"] is not None:
+            logger.info(f"Rotated {cluster['panels']} panels by {-cluster['angle']:.2f} degrees")
+
     # Step 2: Filter for valid rectangles
-    valid_rectangles = [polyline for polyline in lwpolylines if validate_rectangle(polyline)]
+    with stage("validate") as span:
+        valid_rectangles = [polyline for polyline in lwpolylines if validate_rectangle(polyline)]
+        span["entities"] = len(lwpolylines)
 
-    avg_long, avg_cell = calculate_avg_dimensions(valid_rectangles)
+    # Same deterministic cell size as the array pipeline (see grid_inference)
+    with stage("grid_inference") as span:
+        points = np.array([polyline["points"] for polyline in valid_rectangles], dtype=np.float64).reshape(-1, 4, 2)
+        avg_cell = infer_grid(points)["cell_size"]
+        span["entities"] = len(points)
 
 
     # Step 3: Move all valid rectangles to the origin
@@ -413,7 +1408,9 @@ def master_function(file_path, grid_origin, grid_rows, grid_columns):
             print(f"  Points: {polyline['points']}")"""
 
     # Step 6: Process polylines and write to Excel
-    excel_io = process_polylines_to_excel(flipped_polylines, grid_origin, avg_cell, avg_cell, grid_rows, grid_columns)
+    with stage("write") as span:
+        excel_io = process_polylines_to_excel(flipped_polylines, grid_origin, avg_cell, avg_cell, grid_rows, grid_columns, writer, output)
+        span["entities"] = len(flipped_polylines)
     
     
     print(f"master_function returning object of type: {type(excel_io)}")  # Debugging log
@@ -421,3 +1418,29 @@ def master_function(file_path, grid_origin, grid_rows, grid_columns):
 
     # Return a success message
     #return {"message": "File processed and Excel file saved as 'grid_cells_output.xlsx'"}
+
+
+#########################################################################################################################################################################################
+# Job entry point: runs master_function and writes the workbook to disk (used by the job queue in app.py)
+#########################################################################################################################################################################################
+
+def convert_dxf_to_file(file_path, grid_origin, grid_rows, grid_columns, result_path, profile=False, **options):
+    """
+    Runs master_function, which writes the workbook straight to result_path (it is never held in memory as a whole).
+
+    :param profile: Run the conversion under cProfile and return the report
+    :param options: Passed on to master_function (reader, pipeline, writer)
+    :return: Dictionary with the result_path, how to serve it (download_name, mimetype), the peak RSS of the
+             process that ran the conversion, the collected stage spans and events ("metrics") and the profile
+             report (or None)
+    """
+    with collect() as metrics:
+        if profile:
+            _, report = profiled(master_function, file_path, grid_origin, grid_rows, grid_columns, output=result_path, **options)
+        else:
+            master_function(file_path, grid_origin, grid_rows, grid_columns, output=result_path, **options)
+            report = None
+
+    extension, mimetype = OUTPUT_FORMATS[options.get("writer", "openpyxl")]
+    return {"result_path": result_path, "download_name": f"grid_cells_output.{extension}", "mimetype": mimetype,
+            "peak_rss_mb": round(peak_rss_mb(), 1), "metrics": metrics, "profile": report}
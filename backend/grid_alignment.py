@@ -0,0 +1,122 @@
+import numpy as np
+
+
+
+#########################################################################################################################################################################################
+# Grid alignment: rotates arrays built at an azimuth into the axis-aligned frame the grid mapping expects
+#########################################################################################################################################################################################
+
+# Panel orientations are histogrammed in bins of this width (degrees, over the 90 degree period of a rectangle)
+BIN_DEGREES = 0.25
+
+# Panels within this many degrees of a cluster's peak belong to the cluster
+CLUSTER_DEGREES = 2.0
+
+# At most this many orientation clusters are detected; a cluster needs MIN_CLUSTER_PANELS panels
+# and MIN_CLUSTER_SHARE of all panels
+MAX_CLUSTERS = 8
+MIN_CLUSTER_PANELS = 4
+MIN_CLUSTER_SHARE = 0.01
+
+# Clusters closer than this to axis-aligned are left as they are, so axis-aligned drawings are not touched
+MIN_ROTATION_DEGREES = 0.05
+
+
+def panel_orientations(points):
+    """
+    Orientation of every panel in degrees, folded into [-45, 45): the direction of its first edge, which for a
+    rectangle is one of its principal axes. Only the first two vertices are read.
+
+    :param points: (N, 4, 2) vertex array
+    """
+    edges = points[:, 1] - points[:, 0]
+    angles = np.degrees(np.arctan2(edges[:, 1], edges[:, 0]))
+    return (angles + 45.0) % 90.0 - 45.0
+
+
+def find_orientation_clusters(angles):
+    """
+    Finds the dominant panel orientations with a histogram: the highest bin starts a cluster, the bins
+    within CLUSTER_DEGREES of it (wrapping around the 90 degree period) are claimed, and so on.
+
+    :param angles: (N,) orientations from panel_orientations
+    :return: Tuple (labels (N,) int, -1 for panels in no cluster, list of cluster angles in degrees)
+    """
+    bin_count = int(round(90.0 / BIN_DEGREES))
+    bins = np.floor((angles + 45.0) / BIN_DEGREES).astype(np.int64) % bin_count
+    counts = np.bincount(bins, minlength=bin_count)
+
+    bin_labels = np.full(bin_count, -1, dtype=np.int64)
+    window = int(np.ceil(CLUSTER_DEGREES / BIN_DEGREES))
+    min_panels = max(MIN_CLUSTER_PANELS, MIN_CLUSTER_SHARE * len(angles))
+    available = counts.copy()
+    clusters = 0
+    while clusters < MAX_CLUSTERS:
+        peak = int(np.argmax(available))
+        if available[peak] < min_panels:
+            break
+        claimed = np.arange(peak - window, peak + window + 1) % bin_count
+        claimed = claimed[bin_labels[claimed] == -1]
+        bin_labels[claimed] = clusters
+        available[claimed] = 0
+        clusters += 1
+
+    labels = bin_labels[bins]
+
+    # Refine each cluster to the circular mean of its members (on the 90 degree period, hence the factor 4)
+    in_cluster = labels >= 0
+    radians = np.radians(angles[in_cluster]) * 4
+    cos_sum = np.bincount(labels[in_cluster], weights=np.cos(radians), minlength=clusters)
+    sin_sum = np.bincount(labels[in_cluster], weights=np.sin(radians), minlength=clusters)
+    cluster_angles = (np.degrees(np.arctan2(sin_sum, cos_sum)) / 4).tolist()
+    return labels, cluster_angles
+
+
+def align_panels(points):
+    """
+    Rotates every orientation cluster about the centre of its bounding box by minus its angle, so all panels
+    of a rotated array become axis-aligned before validation, grid inference and mapping. Clusters within
+    MIN_ROTATION_DEGREES of the axes and panels in no cluster keep their coordinates.
+
+    Each cluster stays anchored where it was drawn (its bounding box keeps its centre) and keeps its own
+    layout, so arrays keep their placement relative to each other. Arrays at different angles that lie close
+    together can still cover the same cells once aligned; the grid mapping reports those as collisions.
+
+    :param points: (N, 4, 2) vertex array
+    :return: Tuple (aligned (N, 4, 2) vertices, list of {"angle", "panels", "pivot"} per cluster);
+             points itself is returned when nothing needs rotating
+    """
+    if not len(points):
+        return points, []
+
+    labels, cluster_angles = find_orientation_clusters(panel_orientations(points))
+    panel_counts = np.bincount(labels[labels >= 0], minlength=len(cluster_angles))
+    clusters = [{"angle": angle, "panels": int(count), "pivot": None} for angle, count in zip(cluster_angles, panel_counts)]
+
+    rotated = [index for index, angle in enumerate(cluster_angles) if abs(angle) >= MIN_ROTATION_DEGREES]
+    if not rotated:
+        return points, clusters
+
+    # Per-cluster rotation and pivot (the centre of its bounding box), with an identity entry at the end
+    # for the unrotated clusters and for panels in no cluster, so all panels are transformed in one pass
+    count = len(cluster_angles)
+    in_cluster = labels >= 0
+    radians = np.zeros(count + 1)
+    pivots = np.zeros((count + 1, 2))
+    for index in rotated:
+        vertices = points[labels == index].reshape(-1, 2)
+        radians[index] = np.radians(-cluster_angles[index])
+        pivots[index] = (vertices.min(axis=0) + vertices.max(axis=0)) / 2
+        clusters[index]["pivot"] = (float(pivots[index, 0]), float(pivots[index, 1]))
+
+    panel_labels = np.where(in_cluster, labels, count)
+    cos = np.cos(radians)[panel_labels][:, None]
+    sin = np.sin(radians)[panel_labels][:, None]
+    pivot = pivots[panel_labels][:, None, :]
+
+    x = points[..., 0] - pivot[..., 0]
+    y = points[..., 1] - pivot[..., 1]
+    aligned = np.empty_like(points)
+    aligned[..., 0] = x * cos - y * sin + pivot[..., 0]
+    aligned[..., 1] = x * sin + y * cos + pivot[..., 1]
+    return aligned, clusters
@@ -0,0 +1,116 @@
+import numpy as np
+
+
+
+#########################################################################################################################################################################################
+# Deterministic grid inference: derives the cell size from every valid rectangle instead of a random sample
+#########################################################################################################################################################################################
+
+# Factor the old sampler applied to the short side; only used when no pitch can be measured (e.g. a single panel)
+LEGACY_GAP_FACTOR = 1.01411
+
+# Upper bound for the occupancy arrays, the resolution is coarsened for drawings that would exceed it
+MAX_BINS = 16 * 1024 * 1024
+
+
+def _mode(values, resolution):
+    """
+    Most frequent value after quantizing to `resolution`, refined to the mean of the samples in the
+    winning bin and its two neighbours. Runs in linear time with np.bincount.
+
+    :return: Tuple (mode, share of the samples that support it), or (None, 0.0) without samples
+    """
+    if not len(values):
+        return None, 0.0
+
+    bins = np.rint(values / resolution).astype(np.int64)
+    offset = bins.min()
+    counts = np.bincount(bins - offset)
+    peak = int(np.argmax(counts)) + offset
+
+    support = np.abs(bins - peak) <= 1
+    return float(values[support].mean()), float(support.sum() / len(values))
+
+
+def _pitches(positions, resolution, min_pitch):
+    """
+    Distances between consecutive distinct positions (e.g. the bottom edges of horizontal panels),
+    found through an occupancy array instead of sorting so it stays linear in the panel count.
+    Distances below min_pitch come from slightly misaligned tables and are ignored.
+    """
+    if len(positions) < 2:
+        return np.empty(0)
+
+    bins = np.rint((positions - positions.min()) / resolution).astype(np.int64)
+    occupied = np.zeros(bins.max() + 1, dtype=bool)
+    occupied[bins] = True
+
+    distances = np.diff(np.flatnonzero(occupied)) * resolution
+    return distances[distances >= min_pitch]
+
+
+def infer_grid(points, resolution=1.0):
+    """
+    Infers the grid cell size from all valid rectangles.
+
+    The short side of the panels is the mode of all short sides. The cell size is the pitch along the
+    short side: the most frequent distance between neighbouring rows of horizontal panels (along y)
+    and neighbouring columns of vertical panels (along x). The same is done along the long side.
+
+    :param points: (N, 4, 2) vertex array of valid rectangles
+    :param resolution: Histogram bin width in drawing units
+    :return: Dictionary with
+             cell_size: Width and height of a grid cell
+             origin: (x, y) of the bottom-left corner of all panels
+             short_side, long_side: Modal panel dimensions
+             pitch_short, pitch_long: Panel pitch along the short and long side (None if not measurable)
+             gap_short, gap_long: Gap between neighbouring panels along the short and long side
+             confidence: 0..1, share of panels and pitch samples that agree with the chosen values
+    """
+    if not len(points):
+        return {"cell_size": 0, "origin": (0.0, 0.0), "short_side": 0, "long_side": 0,
+                "pitch_short": None, "pitch_long": None, "gap_short": None, "gap_long": None, "confidence": 0.0}
+
+    min_xy = points.min(axis=1)
+    sizes = points.max(axis=1) - min_xy
+    short_sides = sizes.min(axis=1)
+    long_sides = sizes.max(axis=1)
+    is_vertical = sizes[:, 1] > sizes[:, 0]
+
+    # Keep the occupancy arrays bounded for very large drawings
+    extent = float((points.reshape(-1, 2).max(axis=0) - min_xy.min(axis=0)).max())
+    resolution = max(resolution, extent / MAX_BINS)
+
+    short_side, short_share = _mode(short_sides, resolution)
+    long_side, _ = _mode(long_sides, resolution)
+
+    # Horizontal panels stack along y with their short side, vertical panels along x
+    short_pitches = np.concatenate((
+        _pitches(min_xy[~is_vertical, 1], resolution, short_side / 2),
+        _pitches(min_xy[is_vertical, 0], resolution, short_side / 2),
+    ))
+    long_pitches = np.concatenate((
+        _pitches(min_xy[~is_vertical, 0], resolution, long_side / 2),
+        _pitches(min_xy[is_vertical, 1], resolution, long_side / 2),
+    ))
+    pitch_short, pitch_share = _mode(short_pitches, resolution)
+    pitch_long, _ = _mode(long_pitches, resolution)
+
+    if pitch_short is None:
+        cell_size = short_side * LEGACY_GAP_FACTOR
+        confidence = 0.0
+    else:
+        cell_size = pitch_short
+        confidence = short_share * pitch_share
+
+    return {
+        "cell_size": cell_size,
+        "origin": tuple(min_xy.min(axis=0).tolist()),
+        "short_side": short_side,
+        "long_side": long_side,
+        "pitch_short": pitch_short,
+        "pitch_long": pitch_long,
+        "gap_short": pitch_short - short_side if pitch_short is not None else None,
+        "gap_long": pitch_long - long_side if pitch_long is not None else None,
+        "confidence": confidence,
+    }
@@ -0,0 +1,28 @@
+import os
+
+# Read by app.py at import: worker pools get the warm-up initializer
+os.environ.setdefault("WARM_UP", "1")
+
+
+
+#########################################################################################################################################################################################
+# Production serving with gunicorn: gunicorn -c gunicorn.conf.py app:app
+#########################################################################################################################################################################################
+
+bind = os.environ.get("BIND", f"0.0.0.0:{os.environ.get('PORT', 5001)}")
+
+# Import the app (NumPy, ezdxf, openpyxl, Flask and the column label table) once in the master, before the fork
+preload_app = True
+
+# One web worker process: job and upload state lives in its memory (jobs.JobQueue), so requests for the same
+# job must reach the same process. Requests are served by threads, conversions run in its warm process pools.
+workers = 1
+worker_class = "gthread"
+threads = int(os.environ.get("THREADS", 8))
+timeout = 120
+
+
+def post_fork(server, worker):
+    # The conversion workers are forked from the web worker, so they are started after the fork
+    from app import start_warm_up
+    start_warm_up()
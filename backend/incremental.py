@@ -0,0 +1,334 @@
+import fcntl
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from io import BytesIO
+
+import numpy as np
+
+import functions
+from instrumentation import stage, collect
+
+
+
+#########################################################################################################################################################################################
+# Incremental re-conversion: diff a new revision of a drawing against the fingerprint of the previous run
+#########################################################################################################################################################################################
+
+# Vertices are hashed at this precision (drawing units), so re-saving a drawing does not change the hashes
+GEOMETRY_PRECISION = 0.01
+
+# Relative change of the cell size or absolute change of the move/mirror offset that forces a full rebuild
+CELL_SIZE_TOLERANCE = 1e-6
+OFFSET_TOLERANCE = GEOMETRY_PRECISION
+# Change of a rotated array's angle (degrees) or pivot that forces a full rebuild
+ANGLE_TOLERANCE = 1e-3
+
+# Projects that were not converted for this many seconds are removed (see ProjectStore.expire)
+PROJECT_EXPIRY_SECONDS = 30 * 24 * 3600
+
+# Odd 64-bit multipliers for mixing the 8 quantized coordinates of a panel into one hash
+_HASH_MULTIPLIERS = np.array([
+    0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93,
+    0xFF51AFD7ED558CCD, 0xC4CEB9FE1A85EC53, 0x94D049BB133111EB, 0xBF58476D1CE4E5B9,
+], dtype=np.uint64)
+
+
+def geometry_hashes(points):
+    """
+    One uint64 hash per panel of its vertices, quantized to GEOMETRY_PRECISION.
+    """
+    quantized = np.rint(points.reshape(-1, 8) / GEOMETRY_PRECISION).astype(np.int64).view(np.uint64)
+    with np.errstate(over="ignore"):
+        mixed = quantized * _HASH_MULTIPLIERS
+        return np.bitwise_xor.reduce(mixed ^ (mixed >> np.uint64(29)), axis=1)
+
+
+def fingerprint(panels, mapping, grid_origin, grid_rows, grid_columns):
+    """
+    Compact description of one run: a key and geometry hash per mapped panel, its cells and the grid parameters.
+
+    Panels are keyed by their DXF handle, which CAD tools keep when an entity is moved; drawings without
+    handles are keyed by geometry, in which case a moved panel shows up as removed + added.
+    """
+    valid_handles = panels["handle"][mapping["valid"]] if "handle" in panels else None
+    mapped = mapping["mapped"]
+    hashes = geometry_hashes(panels["points"][mapping["valid"]])
+
+    if valid_handles is not None and np.all(valid_handles != 0) and len(np.unique(valid_handles)) == len(valid_handles):
+        keys, keyed_by = valid_handles, "handle"
+    else:
+        keys, keyed_by = hashes, "geometry"
+
+    return {
+        "keys": keys[mapped],
+        "hashes": hashes[mapped],
+        "cells": np.column_stack((mapping["rows"], mapping["cols"], mapping["adjacent_rows"], mapping["adjacent_cols"]))[mapped],
+        "grid": {
+            "cell_size": mapping["grid"]["cell_size"],
+            "offset": list(mapping["offset"]),
+            "grid_origin": list(grid_origin),
+            "grid_rows": grid_rows,
+            "grid_columns": grid_columns,
+            "keyed_by": keyed_by,
+            "rotations": [[cluster["angle"], *cluster["pivot"]] for cluster in mapping["alignment"] if cluster["pivot"] is not None],
+        },
+    }
+
+
+def grid_changed(previous, current):
+    """
+    True if the grid parameters differ enough that every cell assignment may have shifted.
+    """
+    if (previous["grid_origin"], previous["grid_rows"], previous["grid_columns"], previous["keyed_by"]) != \
+            (current["grid_origin"], current["grid_rows"], current["grid_columns"], current["keyed_by"]):
+        return True
+    if abs(previous["cell_size"] - current["cell_size"]) > CELL_SIZE_TOLERANCE * max(abs(current["cell_size"]), 1.0):
+        return True
+    previous_rotations, current_rotations = previous.get("rotations", []), current.get("rotations", [])
+    if len(previous_rotations) != len(current_rotations):
+        return True
+    # [angle, pivot x, pivot y]; projects saved while rotated clusters were moved by whole cells also stored
+    # a (row, column) offset, their cells may differ and they are converted in full
+    for (previous_angle, *previous_pivot), (current_angle, *current_pivot) in zip(previous_rotations, current_rotations):
+        if abs(previous_angle - current_angle) > ANGLE_TOLERANCE or len(previous_pivot) != len(current_pivot) or \
+                any(abs(a - b) > OFFSET_TOLERANCE for a, b in zip(previous_pivot, current_pivot)):
+            return True
+    return any(abs(a - b) > OFFSET_TOLERANCE for a, b in zip(previous["offset"], current["offset"]))
+
+
+def diff_fingerprints(previous, current):
+    """
+    Compares two fingerprints by panel key.
+
+    :return: Dictionary with index arrays "added" (into current), "removed" (into previous),
+             "moved_previous"/"moved_current" (the same panels in both, whose geometry or cells changed)
+             and the "unchanged" count
+    """
+    previous_keys, current_keys = previous["keys"], current["keys"]
+    common, previous_index, current_index = np.intersect1d(previous_keys, current_keys, return_indices=True)
+
+    changed = (previous["hashes"][previous_index] != current["hashes"][current_index]) | \
+        np.any(previous["cells"][previous_index] != current["cells"][current_index], axis=1)
+
+    return {
+        "added": np.flatnonzero(~np.isin(current_keys, common)),
+        "removed": np.flatnonzero(~np.isin(previous_keys, common)),
+        "moved_previous": previous_index[changed],
+        "moved_current": current_index[changed],
+        "unchanged": int((~changed).sum()),
+    }
+
+
+def _replace_file(path, write, mode="wb"):
+    """
+    Writes a file through write(file) to a temporary name next to path and moves it into place, so readers
+    see either the old or the new file, never a partial one.
+    """
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, mode) as temporary_file:
+        write(temporary_file)
+    os.replace(temporary_path, path)
+
+
+class ProjectStore:
+    """
+    Keeps the fingerprint and workbook of the last run of every project in folder/<project_key>/.
+
+    A run of a project reads the previous state and saves the new one while holding the project's lock
+    (see lock), so two revisions converted at the same time on different workers cannot interleave and leave
+    the fingerprint of one next to the workbook of the other. Projects not converted for expiry_seconds are
+    removed by expire.
+    """
+
+    def __init__(self, folder, expiry_seconds=PROJECT_EXPIRY_SECONDS):
+        self.folder = folder
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        self.expiry_seconds = expiry_seconds
+
+    @contextmanager
+    def lock(self, project_key, blocking=True):
+        """
+        Holds an exclusive lock on the project (flock on folder/<project_key>.lock), across threads and processes.
+
+        :raises BlockingIOError: If blocking is False and the project is locked
+        """
+        lock_path = os.path.join(self.folder, f"{project_key}.lock")
+        while True:
+            lock_file = open(lock_path, "a")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                lock_file.close()
+                raise
+            # expire removes the lock file of a project while holding its lock; if that happened while this
+            # process waited, the lock is on the removed file and the project has to be locked again
+            try:
+                if os.path.samestat(os.fstat(lock_file.fileno()), os.stat(lock_path)):
+                    break
+            except FileNotFoundError:
+                pass
+            lock_file.close()
+
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    def _paths(self, project_key):
+        project_folder = os.path.join(self.folder, project_key)
+        return (project_folder, os.path.join(project_folder, "fingerprint.npz"),
+                os.path.join(project_folder, "grid.json"), os.path.join(project_folder, "workbook.xlsx"))
+
+    def _last_used(self, project_key):
+        """
+        Time of the last run of the project (the grid.json written by save), or of its lock file without one.
+        """
+        project_folder, _, grid_path, _ = self._paths(project_key)
+        for path in (grid_path, os.path.join(self.folder, f"{project_key}.lock"), project_folder):
+            try:
+                return os.path.getmtime(path)
+            except FileNotFoundError:
+                pass
+        return None
+
+    def expire(self):
+        """
+        Removes every project (folder and lock file) whose last run is more than expiry_seconds ago.
+        Projects that are locked right now are left alone.
+        """
+        if self.expiry_seconds is None:
+            return
+        cutoff = time.time() - self.expiry_seconds
+        project_keys = {name[:-len(".lock")] if name.endswith(".lock") else name for name in os.listdir(self.folder)}
+        for project_key in project_keys:
+            last_used = self._last_used(project_key)
+            if last_used is None or last_used >= cutoff:
+                continue
+            try:
+                with self.lock(project_key, blocking=False):
+                    if self._last_used(project_key) < cutoff:  # Not converted while we waited for the lock
+                        shutil.rmtree(self._paths(project_key)[0], ignore_errors=True)
+                        os.remove(os.path.join(self.folder, f"{project_key}.lock"))
+            except BlockingIOError:
+                pass
+
+    def load(self, project_key):
+        """
+        Returns (fingerprint, workbook path) of the previous run, or (None, None).
+        """
+        _, arrays_path, grid_path, workbook_path = self._paths(project_key)
+        if not (os.path.exists(arrays_path) and os.path.exists(grid_path) and os.path.exists(workbook_path)):
+            return None, None
+
+        with np.load(arrays_path) as arrays:
+            previous = {name: arrays[name] for name in ("keys", "hashes", "cells")}
+        with open(grid_path) as grid_file:
+            previous["grid"] = json.load(grid_file)
+        return previous, workbook_path
+
+    def save(self, project_key, current, excel_io=None):
+        """
+        Stores the fingerprint of a run and its workbook; without excel_io the stored workbook is kept.
+        """
+        project_folder, arrays_path, grid_path, workbook_path = self._paths(project_key)
+        if not os.path.exists(project_folder):
+            os.makedirs(project_folder)
+
+        # Every file is replaced atomically; call this while holding lock(project_key)
+        _replace_file(arrays_path, lambda arrays_file: np.savez(
+            arrays_file, keys=current["keys"], hashes=current["hashes"], cells=current["cells"]))
+        if excel_io is not None:
+            _replace_file(workbook_path, lambda workbook_file: workbook_file.write(excel_io.getbuffer()))
+        # Written last, its time is the time of the last run (see expire)
+        _replace_file(grid_path, lambda grid_file: json.dump(current["grid"], grid_file), mode="w")
+
+
+def revision_summary(previous, current):
+    """
+    Diff summary of a revision against the previous run of its project.
+
+    :return: Dictionary with "mode": "reused" if the previous workbook can be returned as it is (same panels
+             in the same cells, written by the same writer and output version), "full" otherwise, with the
+             "reason"; "panels" and, when the runs are comparable, the "added", "removed", "moved" and
+             "unchanged" panel counts
+    """
+    summary = {"panels": len(current["keys"])}
+    if previous is None:
+        return dict(summary, mode="full", reason="no previous run")
+    if grid_changed(previous["grid"], current["grid"]):
+        return dict(summary, mode="full", reason="grid parameters changed")
+
+    changes = diff_fingerprints(previous, current)
+    summary.update(added=len(changes["added"]), removed=len(changes["removed"]),
+                   moved=len(changes["moved_current"]), unchanged=changes["unchanged"])
+    if summary["added"] or summary["removed"] or summary["moved"]:
+        return dict(summary, mode="full", reason="panels changed")
+    if previous["grid"].get("output") != current["grid"]["output"]:
+        return dict(summary, mode="full", reason="output format changed")
+    return dict(summary, mode="reused")
+
+
+def incremental_convert(file_path, grid_origin, grid_rows, grid_columns, project_key, store, reader="mmap", writer="xml",
+                        layers=None):
+    """
+    Converts a new revision of a project's drawing and diffs it against the fingerprint of the previous run.
+
+    A revision whose panels all kept their geometry and cells gets the stored workbook back without writing one.
+    Any other revision is written in full: the changed merges are not patched into the previous workbook,
+    since panel numbers follow the position of every panel, so one added or removed panel renumbers the
+    grid sheet and rewrites the summary sheets, which costs as much as writing the workbook again.
+
+    The grid parameters (cell size, origin, move/mirror offset, grid size, rotation of rotated arrays) are
+    compared first; when they changed, every cell assignment may have shifted and the panels are not diffed.
+    The project is locked from loading the previous run until the new one is saved.
+
+    :param store: ProjectStore holding the previous runs
+    :param reader, layers: See functions.read_panels
+    :return: Tuple (BytesIO workbook, diff summary dictionary, see revision_summary)
+    """
+    store.expire()
+    with stage("read") as span:
+        panels = functions.read_panels(file_path, reader, layers)
+        span["entities"] = len(panels["points"])
+    mapping = functions.map_panels_to_cells(panels, grid_origin, grid_rows, grid_columns)
+    current = fingerprint(panels, mapping, grid_origin, grid_rows, grid_columns)
+    current["grid"]["output"] = [functions.OUTPUT_VERSION, writer]
+
+    with store.lock(project_key):
+        previous, workbook_path = store.load(project_key)
+        summary = revision_summary(previous, current)
+        if summary["mode"] == "reused":
+            with open(workbook_path, "rb") as workbook_file:
+                excel_io = BytesIO(workbook_file.read())
+            store.save(project_key, current)
+        else:
+            with stage("write") as span:
+                excel_io = functions.EXCEL_WRITERS[writer](current["cells"])
+                span["entities"] = len(current["cells"])
+            store.save(project_key, current, excel_io)
+    excel_io.seek(0)
+    return excel_io, summary
+
+
+def convert_dxf_incremental_to_file(file_path, grid_origin, grid_rows, grid_columns, result_path, project_key,
+                                    project_folder, project_expiry_seconds=PROJECT_EXPIRY_SECONDS, **options):
+    """
+    Job entry point for incremental_convert, saves the workbook to result_path (see functions.convert_dxf_to_file).
+
+    :param project_expiry_seconds: Projects not converted for this long are removed (see ProjectStore.expire)
+
+    :return: Dictionary with the result_path, the diff summary and the collected stage metrics
+    """
+    with collect() as metrics:
+        excel_io, summary = incremental_convert(file_path, grid_origin, grid_rows, grid_columns, project_key,
+                                                ProjectStore(project_folder, project_expiry_seconds), **options)
+        with open(result_path, "wb") as result_file:
+            result_file.write(excel_io.getbuffer())
+
+    return {"result_path": result_path, "peak_rss_mb": round(functions.peak_rss_mb(), 1), "metrics": metrics,
+            "diff": summary}
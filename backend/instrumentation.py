@@ -0,0 +1,198 @@
+import cProfile
+import io
+import json
+import logging
+import pstats
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+
+#########################################################################################################################################################################################
+# Instrumentation: stage spans (wall/CPU time, peak allocation, entity counts), event counters and Prometheus output
+#########################################################################################################################################################################################
+
+logger = logging.getLogger("dxf_converter")
+
+# Per-entity events (e.g. "not_a_rectangle") are counted; only the first few per run are logged
+LOG_SAMPLES_PER_EVENT = 5
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(process)d] %(message)s"
+
+
+def configure_logging(level="INFO"):
+    """
+    Sends the converter's log records (sampled events as JSON, pipeline messages) to stderr at level.
+    Call it once in the entry point (app.py, batch CLI); worker processes forked afterwards inherit it.
+    """
+    if not any(getattr(handler, "dxf_converter", False) for handler in logger.handlers):
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        handler.dxf_converter = True
+        logger.addHandler(handler)
+        logger.propagate = False  # Do not log twice when the root logger is configured as well
+    logger.setLevel(level)
+
+_local = threading.local()
+
+
+def _peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MetricsRegistry:
+    """
+    Process-wide totals of stage spans and event counters.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}  # stage -> {"runs", "wall_seconds", "cpu_seconds", "entities", "peak_alloc_bytes"}
+        self.events = {}  # event -> count
+
+    def add_span(self, span):
+        with self.lock:
+            totals = self.stages.setdefault(span["stage"], {
+                "runs": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0, "entities": 0, "peak_alloc_bytes": 0})
+            totals["runs"] += 1
+            totals["wall_seconds"] += span["wall_seconds"]
+            totals["cpu_seconds"] += span["cpu_seconds"]
+            totals["entities"] += span["entities"]
+            totals["peak_alloc_bytes"] = max(totals["peak_alloc_bytes"], span["peak_alloc_bytes"])
+
+    def add_event(self, event, amount=1):
+        with self.lock:
+            self.events[event] = self.events.get(event, 0) + amount
+
+    def merge(self, collected):
+        """
+        Adds the spans and events collected in another process (see collect()).
+        """
+        for span in collected.get("spans", []):
+            self.add_span(span)
+        for event, amount in collected.get("events", {}).items():
+            self.add_event(event, amount)
+
+    def render_prometheus(self, gauges=None):
+        """
+        Renders all metrics in the Prometheus text exposition format.
+
+        :param gauges: Optional {name: (help, value)} of extra gauges, e.g. queue depth
+        """
+        with self.lock:
+            stages = {stage: dict(totals) for stage, totals in self.stages.items()}
+            events = dict(self.events)
+
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        metric("dxf_stage_runs_total", "counter", "Number of times a pipeline stage ran.",
+               [({"stage": stage}, totals["runs"]) for stage, totals in sorted(stages.items())])
+        metric("dxf_stage_wall_seconds_total", "counter", "Wall time spent in a pipeline stage.",
+               [({"stage": stage}, round(totals["wall_seconds"], 6)) for stage, totals in sorted(stages.items())])
+        metric("dxf_stage_cpu_seconds_total", "counter", "CPU time spent in a pipeline stage.",
+               [({"stage": stage}, round(totals["cpu_seconds"], 6)) for stage, totals in sorted(stages.items())])
+        metric("dxf_stage_entities_total", "counter", "Entities handled by a pipeline stage.",
+               [({"stage": stage}, totals["entities"]) for stage, totals in sorted(stages.items())])
+        metric("dxf_stage_peak_alloc_bytes", "gauge", "Largest peak allocation seen in a pipeline stage.",
+               [({"stage": stage}, totals["peak_alloc_bytes"]) for stage, totals in sorted(stages.items())])
+        metric("dxf_events_total", "counter", "Per-entity events such as skipped polylines.",
+               [({"event": event}, count) for event, count in sorted(events.items())])
+        for name, (help_text, value) in sorted((gauges or {}).items()):
+            metric(name, "gauge", help_text, [({}, value)])
+
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+@contextmanager
+def collect():
+    """
+    Collects the spans and events of this thread in a dictionary instead of the process registry,
+    so a worker process can return them to the app (which adds them with REGISTRY.merge).
+    """
+    collected = {"spans": [], "events": {}}
+    previous = getattr(_local, "collected", None)
+    _local.collected = collected
+    try:
+        yield collected
+    finally:
+        _local.collected = previous
+
+
+@contextmanager
+def stage(name):
+    """
+    Records one pipeline stage. Set span["entities"] inside the block to record how many entities it handled.
+
+    Peak allocation is measured with tracemalloc when it is tracing (python -X tracemalloc), otherwise
+    the growth of the process peak RSS during the stage is used, which is free but coarser.
+    """
+    span = {"stage": name, "entities": 0}
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+        start_alloc = tracemalloc.get_traced_memory()[0]
+    else:
+        start_rss = _peak_rss_bytes()
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    try:
+        yield span
+    finally:
+        span["wall_seconds"] = time.perf_counter() - start_wall
+        span["cpu_seconds"] = time.process_time() - start_cpu
+        if tracing:
+            span["peak_alloc_bytes"] = tracemalloc.get_traced_memory()[1] - start_alloc
+        else:
+            span["peak_alloc_bytes"] = _peak_rss_bytes() - start_rss
+
+        collected = getattr(_local, "collected", None)
+        if collected is not None:
+            collected["spans"].append(span)
+        else:
+            REGISTRY.add_span(span)
+
+
+def event(name, amount=1, **fields):
+    """
+    Counts a per-entity event; the first LOG_SAMPLES_PER_EVENT occurrences per run are also logged as JSON.
+    """
+    collected = getattr(_local, "collected", None)
+    if collected is not None:
+        seen = collected["events"].get(name, 0)
+        collected["events"][name] = seen + amount
+    else:
+        with REGISTRY.lock:
+            seen = REGISTRY.events.get(name, 0)
+        REGISTRY.add_event(name, amount)
+
+    if seen < LOG_SAMPLES_PER_EVENT and fields:
+        logger.info(json.dumps({"event": name, **fields}, default=str))
+
+
+def profiled(function, *args, **kwargs):
+    """
+    Runs function under cProfile.
+
+    :return: Tuple (return value, text of the 30 most expensive calls by cumulative time)
+    """
+    profiler = cProfile.Profile()
+    value = profiler.runcall(function, *args, **kwargs)
+    report = io.StringIO()
+    pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(30)
+    return value, report.getvalue()
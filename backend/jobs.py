@@ -0,0 +1,206 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from cache import link_file
+
+
+
+#########################################################################################################################################################################################
+# Local job queue: runs conversions on a worker pool so requests return immediately (no external broker)
+#########################################################################################################################################################################################
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at its depth limit."""
+
+
+class JobQueue:
+    """
+    Runs jobs on a bounded worker pool and keeps track of their status.
+
+    Each job function writes its result to result_path, so finished workbooks live on disk
+    rather than in memory. At most max_workers jobs run at once and at most max_pending jobs
+    (queued + running) are accepted, which bounds memory use under concurrent uploads.
+
+    Finished jobs are forgotten and their result files removed expiry_seconds after they finish (see expire),
+    so neither the job table nor the result folder grows without bound.
+
+    Worker processes are forked from the app process, so they start with its imported modules; initializer
+    (with initargs) runs once in every worker before its first job, e.g. to warm it up (see warmup.py).
+
+    A process pool is unusable once one of its workers dies (e.g. killed for running out of memory on a large
+    drawing): the jobs queued or running on it fail with BrokenProcessPool, and the next submit replaces it.
+    """
+
+    def __init__(self, result_folder, max_workers=2, max_pending=8, executor="process", result_suffix=".xlsx",
+                 initializer=None, initargs=(), expiry_seconds=3600):
+        if executor == "process":
+            self._new_executor = partial(ProcessPoolExecutor, max_workers=max_workers, initializer=initializer, initargs=initargs)
+        elif executor == "thread":
+            self._new_executor = partial(ThreadPoolExecutor, max_workers=max_workers, initializer=initializer, initargs=initargs)
+        else:
+            raise ValueError(f"Unknown executor: {executor}")
+        self.executor = self._new_executor()
+        self.max_workers = max_workers
+
+        self.result_folder = result_folder
+        if not os.path.exists(result_folder):
+            os.makedirs(result_folder)
+
+        self.result_suffix = result_suffix
+        self.max_pending = max_pending
+        self.expiry_seconds = expiry_seconds
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def _status(self, job):
+        future = job["future"]
+        if future is None or not future.done():
+            return "running" if future is not None and future.running() else "queued"
+        return "failed" if future.exception() is not None else "done"
+
+    def start(self):
+        """
+        Starts all workers now instead of on the first jobs and waits until every one has run the initializer.
+        Call it in the process that serves requests (after a server forks, not before).
+
+        :return: Number of workers started
+        """
+        # The pool starts a worker for every task submitted while no worker is idle; the workers only become
+        # idle after the initializer and their first task, so these tasks start max_workers workers
+        futures = [self.executor.submit(os.getpid) for _ in range(self.max_workers)]
+        for future in futures:
+            future.result()
+        return len(futures)
+
+    def pending(self):
+        """
+        Number of jobs that are queued or running.
+        """
+        with self.lock:
+            return sum(1 for job in self.jobs.values() if self._status(job) in ("queued", "running"))
+
+    def submit(self, function, *args, on_done=None, cleanup=(), **kwargs):
+        """
+        Queues function(*args, result_path=..., **kwargs) and returns the job id.
+
+        :param on_done: Optional callback(result_path, info), called in this process when the job succeeds;
+                        info is the dictionary returned by function (or {})
+        :param cleanup: Files or folders (e.g. the uploaded drawing) removed when the job finishes, whether it
+                        succeeded or not; they are left alone when the job is not accepted
+        :raises QueueFullError: If max_pending jobs are already queued or running
+        """
+        self.expire()
+        job_id = uuid.uuid4().hex
+        result_path = os.path.join(self.result_folder, f"{job_id}{self.result_suffix}")
+
+        with self.lock:
+            pending = sum(1 for job in self.jobs.values() if self._status(job) in ("queued", "running"))
+            if pending >= self.max_pending:
+                raise QueueFullError(f"{pending} jobs are already pending")
+
+            job = {"future": None, "result_path": result_path, "finished": None}
+            try:
+                job["future"] = self.executor.submit(function, *args, result_path=result_path, **kwargs)
+            except BrokenProcessPool:
+                # A worker died since the last job, start a new pool (the jobs on the old one have failed)
+                self.executor.shutdown(wait=False)
+                self.executor = self._new_executor()
+                job["future"] = self.executor.submit(function, *args, result_path=result_path, **kwargs)
+            self.jobs[job_id] = job
+
+        def done(future):
+            try:
+                for path in cleanup:
+                    _remove(path)
+                if on_done is not None and future.exception() is None:
+                    result = future.result()
+                    on_done(result_path, result if isinstance(result, dict) else {})
+            finally:
+                # Set last, so the job does not expire before on_done has used its result
+                job["finished"] = time.time()
+        job["future"].add_done_callback(done)
+        return job_id
+
+    def complete(self, source_path, info=None):
+        """
+        Registers an already finished job (e.g. a cache hit) whose result is the file source_path, and returns
+        its job id. The file is linked (see cache.link_file), not read.
+
+        :param info: Optional dictionary reported as the job's info (see status)
+        :raises FileNotFoundError: If source_path does not exist (any more)
+        """
+        self.expire()
+        job_id = uuid.uuid4().hex
+        result_path = os.path.join(self.result_folder, f"{job_id}{self.result_suffix}")
+        link_file(source_path, result_path)
+
+        future = Future()
+        future.set_result(dict(info or {}, result_path=result_path))
+        with self.lock:
+            self.jobs[job_id] = {"future": future, "result_path": result_path, "finished": time.time()}
+        return job_id
+
+    def expire(self):
+        """
+        Forgets jobs that finished more than expiry_seconds ago and removes their result files, as well as
+        result files no job refers to any more (e.g. from before a restart) once they are that old.
+        """
+        cutoff = time.time() - self.expiry_seconds
+        with self.lock:
+            expired = [job_id for job_id, job in self.jobs.items()
+                       if job["finished"] is not None and job["finished"] < cutoff]
+            expired_paths = [self.jobs.pop(job_id)["result_path"] for job_id in expired]
+            known_paths = {job["result_path"] for job in self.jobs.values()}
+
+        for path in expired_paths:
+            _remove(path)
+        for name in os.listdir(self.result_folder):
+            path = os.path.join(self.result_folder, name)
+            if not name.endswith(self.result_suffix) or path in known_paths:
+                continue
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def status(self, job_id):
+        """
+        Returns {"status", "result_path", "error", "info"} for the job, or None for an unknown job id.
+        Status is one of "queued", "running", "done" or "failed"; info is the dictionary returned by
+        a finished job function, if any.
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            status = self._status(job)
+            error = job["future"].exception() if status == "failed" else None
+            if isinstance(error, BrokenProcessPool):
+                error = "A worker process died (e.g. out of memory) while the job was queued or running"
+            result = job["future"].result() if status == "done" else None
+            return {
+                "status": status,
+                "result_path": job["result_path"],
+                "error": str(error) if error else None,
+                "info": result if isinstance(result, dict) else {},
+            }
+
+
+def _remove(path):
+    """
+    Removes a file or a folder with everything in it, if it still exists.
+    """
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
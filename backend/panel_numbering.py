@@ -0,0 +1,81 @@
+import numpy as np
+
+from addressing import cells_to_ranges, column_labels
+
+
+
+#########################################################################################################################################################################################
+# Panel numbering: panels are numbered in reading order and grouped into strings and rows in one pass over the sorted cells
+#########################################################################################################################################################################################
+
+SUMMARY_SHEET = "Summary"
+STRINGS_SHEET = "Strings"
+
+STRING_HEADER = ["String", "Row", "First column", "Last column", "Panels", "First panel", "Last panel"]
+SUMMARY_HEADER = ["Row", "Panels", "Strings"]
+
+
+def number_panels(grid_cells):
+    """
+    Numbers the panels row by row, left to right (by the top-left cell of their merged range) and groups them:
+    a string is a run of panels in the same rows whose ranges touch end to start, a row is all panels whose
+    range starts in the same sheet row. The panels are sorted once, every grouping after that is linear.
+
+    :param grid_cells: (M, 4) array or iterable of 0-based (row, col, adjacent_row, adjacent_col)
+    :return: Dictionary with
+             numbers: (M,) 1-based panel number, in the order of grid_cells
+             ranges: (M, 4) 1-based merged ranges (see addressing.cells_to_ranges), in the order of grid_cells
+             strings: (S, 6) int array of (row, first_column, last_column, panels, first_number, last_number), 1-based
+             rows: (R, 3) int array of (row, panels, strings), 1-based rows
+    """
+    ranges = cells_to_ranges(grid_cells)
+    count = len(ranges)
+    if not count:
+        return {"numbers": np.empty(0, dtype=np.int64), "ranges": ranges,
+                "strings": np.empty((0, 6), dtype=np.int64), "rows": np.empty((0, 3), dtype=np.int64)}
+
+    order = np.lexsort((ranges[:, 1], ranges[:, 0]))
+    first_row, first_col, last_row, last_col = ranges[order].T
+    numbers = np.empty(count, dtype=np.int64)
+    numbers[order] = np.arange(1, count + 1)
+
+    # A string breaks where the row changes, the panel height changes or there is a gap to the previous panel
+    new_row = np.ones(count, dtype=bool)
+    new_row[1:] = first_row[1:] != first_row[:-1]
+    new_string = new_row.copy()
+    new_string[1:] |= (last_row[1:] != last_row[:-1]) | (first_col[1:] != last_col[:-1] + 1)
+
+    string_starts = np.flatnonzero(new_string)
+    string_ends = np.append(string_starts[1:], count) - 1
+    strings = np.column_stack((first_row[string_starts], first_col[string_starts], last_col[string_ends],
+                               string_ends - string_starts + 1, string_starts + 1, string_ends + 1))
+
+    row_starts = np.flatnonzero(new_row)
+    rows = np.column_stack((first_row[row_starts], np.diff(np.append(row_starts, count)),
+                            np.add.reduceat(new_string.astype(np.int64), row_starts)))
+    return {"numbers": numbers, "ranges": ranges, "strings": strings, "rows": rows}
+
+
+def string_table(numbering):
+    """
+    Rows of the strings sheet: a header and one line per string, with column letters as in the grid sheet.
+    """
+    strings = numbering["strings"]
+    labels = column_labels(int(strings[:, 2].max()) if len(strings) else 0)
+    table = [STRING_HEADER]
+    table.extend(
+        [index, row, labels[first_col - 1], labels[last_col - 1], panels, first_number, last_number]
+        for index, (row, first_col, last_col, panels, first_number, last_number) in enumerate(strings.tolist(), start=1)
+    )
+    return table
+
+
+def summary_table(numbering):
+    """
+    Rows of the summary sheet: a header, one line per row with its panel and string counts, and the totals.
+    """
+    rows = numbering["rows"]
+    table = [SUMMARY_HEADER]
+    table.extend(rows.tolist())
+    table.append(["Total", len(numbering["numbers"]), len(numbering["strings"])])
+    return table
@@ -0,0 +1,160 @@
+import struct
+import zlib
+from functools import lru_cache
+
+import numpy as np
+
+from functions import read_panels, map_panels_to_cells
+from instrumentation import collect, stage
+
+
+
+#########################################################################################################################################################################################
+# Preview: stops after the grid mapping and stores the cell occupancy as a tile pyramid instead of building a workbook
+#########################################################################################################################################################################################
+
+# Tiles are at most TILE_CELLS x TILE_CELLS cells; zoom 0 fits the whole layout in one tile, the highest zoom is one pixel per cell
+TILE_CELLS = 256
+
+# Palette of the PNG tiles: empty cells, occupied cells
+PNG_PALETTE = bytes((255, 255, 255, 37, 99, 235))
+
+
+def occupancy_matrix(rows, cols, adjacent_rows, adjacent_cols):
+    """
+    Boolean matrix of the cells covered by the mapped panels, bounded to the occupied area (row 0 is Excel row 1).
+
+    :param rows, cols, adjacent_rows, adjacent_cols: 0-based cells of the mapped panels (see map_panels_to_cells)
+    :return: (rows, columns) bool array
+    """
+    if not len(rows):
+        return np.zeros((0, 0), dtype=bool)
+
+    matrix = np.zeros((int(adjacent_rows.max()) + 1, int(adjacent_cols.max()) + 1), dtype=bool)
+    matrix[rows, cols] = True
+    matrix[adjacent_rows, adjacent_cols] = True
+    return matrix
+
+
+def downsample(matrix):
+    """
+    Halves both dimensions; a cell of the result is occupied when any of its 2x2 source cells is.
+    """
+    height, width = matrix.shape
+    padded = np.zeros((height + height % 2, width + width % 2), dtype=bool)
+    padded[:height, :width] = matrix
+    return padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2).any(axis=(1, 3))
+
+
+def tile_pyramid(matrix):
+    """
+    :return: List of occupancy matrices by zoom level, from the coarsest (fits one tile) to matrix itself
+    """
+    levels = [matrix]
+    while max(levels[-1].shape) > TILE_CELLS:
+        levels.append(downsample(levels[-1]))
+    return levels[::-1]
+
+
+def tile_layout(shapes):
+    """
+    :param shapes: (rows, columns) of every zoom level
+    :return: List of {"zoom", "rows", "columns", "tile_rows", "tile_columns"} describing the tiles of every level
+    """
+    return [
+        {"zoom": zoom, "rows": height, "columns": width,
+         "tile_rows": -(-height // TILE_CELLS), "tile_columns": -(-width // TILE_CELLS)}
+        for zoom, (height, width) in enumerate(shapes)
+    ]
+
+
+def preview_dxf_to_file(file_path, grid_origin, grid_rows, grid_columns, result_path, reader="mmap", layers=None):
+    """
+    Job entry point for previews: reads and maps the panels like master_function, then saves the tile
+    pyramid of the occupancy to result_path (.npz, bit-packed per level) instead of writing a workbook.
+
+    :return: Dictionary with the result_path, how to serve it (download_name, mimetype), the "stats" of the
+             mapping, the tile "layout" (see tile_layout) and the collected stage spans and events ("metrics")
+    """
+    with collect() as metrics:
+        with stage("read") as span:
+            panels = read_panels(file_path, reader, layers)
+            span["entities"] = len(panels["points"])
+
+        mapping = map_panels_to_cells(panels, grid_origin, grid_rows, grid_columns)
+        mapped = mapping["mapped"]
+
+        with stage("preview") as span:
+            matrix = occupancy_matrix(mapping["rows"][mapped], mapping["cols"][mapped],
+                                      mapping["adjacent_rows"][mapped], mapping["adjacent_cols"][mapped])
+            levels = tile_pyramid(matrix)
+            arrays = {}
+            for zoom, level in enumerate(levels):
+                arrays[f"level_{zoom}"] = np.packbits(level, axis=1)
+                arrays[f"shape_{zoom}"] = np.array(level.shape)
+            with open(result_path, "wb") as result_file:
+                np.savez_compressed(result_file, **arrays)
+            span["entities"] = int(mapped.sum())
+
+    grid = mapping["grid"]
+    stats = {
+        "panels": int(len(panels["points"])),
+        "rectangles": int(mapping["valid"].sum()),
+        "mapped": int(mapped.sum()),
+        "cell_size": float(grid["cell_size"]),
+        "confidence": float(grid["confidence"]),
+        "rows": int(matrix.shape[0]),
+        "columns": int(matrix.shape[1]),
+        "occupied_cells": int(matrix.sum()),
+        "rotations": [round(cluster["angle"], 2) for cluster in mapping["alignment"] if cluster["pivot"] is not None],
+        "seconds": {span["stage"]: round(span["wall_seconds"], 3) for span in metrics["spans"]},
+    }
+    return {"result_path": result_path, "download_name": "grid_preview.npz", "mimetype": "application/octet-stream",
+            "stats": stats, "layout": tile_layout([level.shape for level in levels]),
+            "metrics": metrics}
+
+
+@lru_cache(maxsize=16)
+def _load_level(result_path, zoom):
+    with np.load(result_path) as previews:
+        height, width = previews[f"shape_{zoom}"].tolist()
+        return np.unpackbits(previews[f"level_{zoom}"], axis=1, count=width).astype(bool).reshape(height, width)
+
+
+def read_tile(result_path, zoom, tile_row, tile_column):
+    """
+    :return: Occupancy of one tile (at most TILE_CELLS x TILE_CELLS), or None when the tile does not exist
+    """
+    try:
+        level = _load_level(result_path, zoom)
+    except KeyError:
+        return None
+    top, left = tile_row * TILE_CELLS, tile_column * TILE_CELLS
+    if tile_row < 0 or tile_column < 0 or top >= level.shape[0] or left >= level.shape[1]:
+        return None
+    return level[top:top + TILE_CELLS, left:left + TILE_CELLS]
+
+
+def encode_png(tile):
+    """
+    Encodes a tile as a 1-bit palette PNG (one pixel per cell, occupied cells in the second palette colour).
+    """
+    height, width = tile.shape
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    # Every scanline starts with filter type 0 followed by the bit-packed row
+    scanlines = np.hstack((np.zeros((height, 1), dtype=np.uint8), np.packbits(tile, axis=1)))
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 1, 3, 0, 0, 0))
+            + chunk(b"PLTE", PNG_PALETTE)
+            + chunk(b"IDAT", zlib.compress(scanlines.tobytes(), 6))
+            + chunk(b"IEND", b""))
+
+
+def pack_tile(tile):
+    """
+    Bit-packed tile: every row padded to whole bytes, most significant bit first (numpy.packbits).
+    """
+    return np.packbits(tile, axis=1).tobytes()
@@ -0,0 +1,21 @@
+import os
+
+# Must be set before app is imported: its worker pools are created at import
+os.environ.setdefault('WARM_UP', '1')
+
+from app import app, start_warm_up
+
+
+
+#########################################################################################################################################################################################
+# Production serving without gunicorn: no debugger or reloader (which imports the app twice), warm workers
+# Run with "python serve.py"; with gunicorn installed use "gunicorn -c gunicorn.conf.py app:app" instead
+#########################################################################################################################################################################################
+
+HOST = os.environ.get('HOST', '0.0.0.0')
+PORT = int(os.environ.get('PORT', 5001))
+
+if __name__ == '__main__':
+    # The app answers right away; /ready reports 503 until the workers are warmed up
+    start_warm_up()
+    app.run(host=HOST, port=PORT, debug=False, use_reloader=False, threaded=True)
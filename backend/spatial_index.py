@@ -0,0 +1,42 @@
+import numpy as np
+
+
+
+#########################################################################################################################################################################################
+# Spatial hash index of grid cells: built once per run, finds overlapping merges
+#########################################################################################################################################################################################
+
+class GridIndex:
+    """
+    Maps every occupied grid cell to the panel that occupies it.
+
+    Panels are added in order; a panel whose cells are already taken by an earlier panel is not added
+    and recorded as a collision instead, so the accepted panels never produce overlapping merges.
+    Building the index is O(1) per cell, O(N) for the whole drawing.
+    """
+
+    def __init__(self, rows, cols, adjacent_rows, adjacent_cols, grid_columns):
+        """
+        :param rows, cols: (N,) 0-based cell of each panel
+        :param adjacent_rows, adjacent_cols: (N,) 0-based second cell of each panel
+        :param grid_columns: Number of grid columns, used to pack (row, col) into one integer key
+        """
+        self.stride = int(grid_columns) + 1  # +1 so the adjacent column of the last column still has its own key
+        self.cells = {}  # row * stride + col -> panel index
+        self.accepted = np.zeros(len(rows), dtype=bool)
+        self.collisions = []  # (panel index, index of the panel it overlaps, (row, col))
+
+        for panel, cell in enumerate(zip(rows.tolist(), cols.tolist(), adjacent_rows.tolist(), adjacent_cols.tolist())):
+            row, col, adjacent_row, adjacent_col = cell
+            key1 = row * self.stride + col
+            key2 = adjacent_row * self.stride + adjacent_col
+
+            other = self.cells.get(key1, self.cells.get(key2))
+            if other is not None:
+                overlap = (row, col) if key1 in self.cells else (adjacent_row, adjacent_col)
+                self.collisions.append((panel, other, overlap))
+                continue
+
+            self.cells[key1] = panel
+            self.cells[key2] = panel
+            self.accepted[panel] = True
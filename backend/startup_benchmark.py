@@ -0,0 +1,160 @@
+import argparse
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+from benchmark import generate_dxf
+
+
+
+#########################################################################################################################################################################################
+# Startup benchmark: import time, time to ready and first-request latency of the serving modes
+#########################################################################################################################################################################################
+
+BACKEND_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+# Serving modes: the development server (app.run(debug=True)), serve.py and gunicorn (if installed)
+MODES = {
+    "debug": [sys.executable, os.path.join(BACKEND_FOLDER, "app.py")],
+    "production": [sys.executable, os.path.join(BACKEND_FOLDER, "serve.py")],
+    "gunicorn": ["gunicorn", "-c", os.path.join(BACKEND_FOLDER, "gunicorn.conf.py"), "--chdir", BACKEND_FOLDER, "app:app"],
+}
+
+STARTUP_TIMEOUT = 60
+POLL_SECONDS = 0.02
+
+
+def measure_import(module="app"):
+    """
+    Seconds to import module in a fresh interpreter (without warm-up).
+    """
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    with tempfile.TemporaryDirectory() as folder:
+        output = subprocess.run([sys.executable, "-c", code], cwd=folder, capture_output=True, text=True, check=True,
+                                env=dict(os.environ, PYTHONPATH=BACKEND_FOLDER, WARM_UP="0"))
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _get(url):
+    try:
+        with urllib.request.urlopen(url, timeout=10) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as error:
+        return error.code, error.read()
+
+
+def _wait_for(url, status=200):
+    deadline = time.perf_counter() + STARTUP_TIMEOUT
+    while time.perf_counter() < deadline:
+        try:
+            if _get(url)[0] == status:
+                return
+        except OSError:
+            pass
+        time.sleep(POLL_SECONDS)
+    raise TimeoutError(f"{url} did not answer {status} within {STARTUP_TIMEOUT} s")
+
+
+def _upload(base_url, file_path):
+    """
+    Posts a drawing to /upload, waits for the job and downloads the result; returns the seconds it took.
+    """
+    boundary = uuid.uuid4().hex
+    with open(file_path, "rb") as dxf_file:
+        body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{os.path.basename(file_path)}\"\r\n"
+                f"Content-Type: application/octet-stream\r\n\r\n").encode() + dxf_file.read() + f"\r\n--{boundary}--\r\n".encode()
+    request = urllib.request.Request(f"{base_url}/upload", data=body, method="POST",
+                                     headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+
+    start = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=60) as response:
+        job = json.loads(response.read())
+    status = job["status"]
+    while status != "done":
+        time.sleep(POLL_SECONDS)
+        status = json.loads(_get(f"{base_url}/jobs/{job['job_id']}")[1])["status"]
+        if status == "failed":
+            raise RuntimeError(f"Conversion of {file_path} failed")
+    _get(f"{base_url}/jobs/{job['job_id']}/result")
+    return time.perf_counter() - start
+
+
+def measure_mode(mode, drawings):
+    """
+    Starts the server in a fresh folder and measures it until it is ready, then converts every drawing once.
+
+    :return: Dictionary with the seconds until the first response ("startup_seconds"), until /ready answers
+             200 ("ready_seconds") and per drawing ("request_seconds"), or None when the server is not installed
+    """
+    command = MODES[mode]
+    if shutil.which(command[0]) is None:
+        return None
+
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory() as folder:
+        start = time.perf_counter()
+        server = subprocess.Popen(command, cwd=folder, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                  env=dict(os.environ, PORT=str(port), PYTHONPATH=BACKEND_FOLDER),
+                                  start_new_session=True)
+        try:
+            _wait_for(f"{base_url}/")
+            startup = time.perf_counter() - start
+            _wait_for(f"{base_url}/ready")
+            ready = time.perf_counter() - start
+            request_seconds = [round(_upload(base_url, drawing), 3) for drawing in drawings]
+        finally:
+            # The debug server runs the app in a reloader child process, stop the whole process group
+            os.killpg(server.pid, signal.SIGTERM)
+            server.wait()
+
+    return {"startup_seconds": round(startup, 3), "ready_seconds": round(ready, 3), "request_seconds": request_seconds}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time, startup and first-request latency of the serving modes.")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES), help="Serving modes to measure")
+    parser.add_argument("--panels", type=int, default=500, help="Panels per test drawing")
+    parser.add_argument("--requests", type=int, default=3, help="Drawings converted after startup (all different, so none is cached)")
+    parser.add_argument("--output", default="startup_results.json", help="JSON file to write the results to")
+    args = parser.parse_args()
+
+    results = {"import_seconds": round(measure_import(), 3), "modes": {}}
+    print(f"import app: {results['import_seconds']} s")
+    with tempfile.TemporaryDirectory() as folder:
+        drawings = []
+        for seed in range(args.requests):
+            drawings.append(os.path.join(folder, f"drawing_{seed}.dxf"))
+            generate_dxf(drawings[-1], args.panels, seed=seed)
+
+        for mode in args.modes:
+            result = measure_mode(mode, drawings)
+            results["modes"][mode] = result
+            if result is None:
+                print(f"{mode}: skipped, {MODES[mode][0]} is not installed")
+            else:
+                print(f"{mode}: first response {result['startup_seconds']} s, ready {result['ready_seconds']} s, "
+                      f"requests {', '.join(f'{seconds} s' for seconds in result['request_seconds'])}")
+
+    with open(args.output, "w") as output_file:
+        json.dump(results, output_file, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+import ezdxf
+import numpy as np
+import pytest
+
+import functions
+from instrumentation import collect
+
+
+
+#########################################################################################################################################################################################
+# Grid mapping regression checks: rotated arrays keep their relative placement, overlapping panels are reported as collisions
+#########################################################################################################################################################################################
+
+PANEL_WIDTH, PANEL_HEIGHT = 2329.8, 1134
+
+
+def panel_array(center, angle, columns=4, rows=3):
+    """
+    Vertices of a columns x rows array of horizontal panels, rotated by angle (degrees) about its center.
+    """
+    xs = (np.arange(columns) - (columns - 1) / 2) * (PANEL_WIDTH + 70)
+    ys = (np.arange(rows) - (rows - 1) / 2) * (PANEL_HEIGHT + 66)
+    corners = np.array([(-1, -1), (1, -1), (1, 1), (-1, 1)]) * (PANEL_WIDTH / 2, PANEL_HEIGHT / 2)
+    points = np.array([[(x + cx, y + cy) for cx, cy in corners] for y in ys for x in xs])
+    radians = np.radians(angle)
+    rotation = np.array([[np.cos(radians), np.sin(radians)], [-np.sin(radians), np.cos(radians)]])
+    return points @ rotation + center
+
+
+def save_drawing(path, arrays):
+    doc = ezdxf.new("R2010")
+    msp = doc.modelspace()
+    for points in arrays:
+        for panel in points:
+            msp.add_lwpolyline(panel.tolist(), close=True)
+    doc.saveas(path)
+    return str(path)
+
+
+def test_rotated_arrays_keep_their_placement():
+    # An axis-aligned array with two arrays at other angles beside it, as in a site layout
+    centers = [(0.0, 0.0), (30000.0, 2000.0), (4000.0, -20000.0)]
+    arrays = [panel_array(centers[0], 0.0), panel_array(centers[1], 20.0), panel_array(centers[2], -30.0)]
+    points = np.concatenate(arrays)
+    panels = {"points": points, "is_closed": np.ones(len(points), dtype=bool), "layer": np.full(len(points), "0", dtype=object)}
+
+    with collect() as metrics:
+        mapping = functions.map_panels_to_cells(panels, (0, 0), 100, 100)
+
+    assert "collision" not in metrics["events"]
+    assert mapping["mapped"].all()
+    # Every array is still where it was drawn relative to the others (rows run down the sheet)
+    cell_size = mapping["grid"]["cell_size"]
+    array_index = np.repeat(np.arange(len(arrays)), [len(array) for array in arrays])
+    cells = np.column_stack((mapping["cols"] + 1, mapping["rows"] + 0.5))
+    cell_centers = np.array([cells[array_index == index].mean(axis=0) for index in range(len(arrays))])
+    drawn = (np.array(centers) - centers[0]) * (1, -1) / cell_size
+    assert np.abs((cell_centers - cell_centers[0]) - drawn).max() < 1
+
+
+@pytest.mark.parametrize("collisions", [False, True])
+def test_pipelines_agree_on_rotated_arrays(tmp_path, collisions):
+    # Arrays drawn apart map side by side; arrays drawn on top of each other at different angles collide
+    second_center = (0.0, 0.0) if collisions else (30000.0, 0.0)
+    file_path = save_drawing(tmp_path / "rotated.dxf", [panel_array((0.0, 0.0), 20.0), panel_array(second_center, -30.0)])
+
+    results = {}
+    for pipeline in ("dict", "array"):
+        with collect() as metrics:
+            csv = functions.master_function(file_path, (0, 0), 100, 100, pipeline=pipeline, writer="csv")
+        results[pipeline] = (csv.getvalue(), metrics["events"].get("collision", 0))
+
+    assert results["dict"] == results["array"]
+    csv, collision_count = results["array"]
+    assert (collision_count > 0) == collisions
+    assert len(csv.decode().splitlines()) - 1 == 24 - collision_count
+
+
+@pytest.mark.parametrize("pipeline", ["dict", "array"])
+def test_overlapping_panels_are_left_out(tmp_path, pipeline):
+    # The second panel covers the same cells as the first, both pipelines keep only the first one
+    doc = ezdxf.new("R2010")
+    msp = doc.modelspace()
+    for x in (0.0, 0.0, 2400.0):
+        msp.add_lwpolyline([(x, 0), (x + 2329.8, 0), (x + 2329.8, 1134), (x, 1134)], close=True)
+    file_path = tmp_path / "overlap.dxf"
+    doc.saveas(file_path)
+
+    with collect() as metrics:
+        csv = functions.master_function(str(file_path), (0, 0), 100, 100, pipeline=pipeline, writer="csv")
+
+    assert metrics["events"]["collision"] == 1
+    assert csv.getvalue().decode().splitlines()[1:] == ["B1:C1,1,2,1,3", "D1:E1,1,4,1,5"]
@@ -0,0 +1,63 @@
+import numpy as np
+
+from panel_numbering import STRING_HEADER, SUMMARY_HEADER, number_panels, string_table, summary_table
+
+
+
+#########################################################################################################################################################################################
+# Panel numbering regression checks: reading order of the numbers and the string and row groupings of the summary sheets
+#########################################################################################################################################################################################
+
+# 0-based (row, col, adjacent_row, adjacent_col), given out of reading order:
+# a vertical panel in H1:H2, a panel in A3:B3 and three horizontal panels in A1:B1, C1:D1 and F1:G1
+CELLS = np.array([(0, 7, 1, 7), (2, 0, 2, 1), (0, 2, 0, 3), (0, 5, 0, 6), (0, 0, 0, 1)])
+
+
+def test_panels_are_numbered_in_reading_order():
+    numbering = number_panels(CELLS)
+
+    assert numbering["numbers"].tolist() == [4, 5, 2, 3, 1]
+    assert numbering["ranges"].tolist() == [[1, 8, 2, 8], [3, 1, 3, 2], [1, 3, 1, 4], [1, 6, 1, 7], [1, 1, 1, 2]]
+
+
+def test_numbers_follow_the_top_left_cell():
+    # Same order as sorting the ranges by (first row, first column), whatever order the panels come in
+    rng = np.random.default_rng(7)
+    rows = rng.permutation(200) % 20
+    cols = rng.permutation(200) * 2
+    is_vertical = rng.random(200) < 0.3
+    cells = np.column_stack((rows, cols, rows + is_vertical, cols + ~is_vertical))
+
+    numbering = number_panels(cells)
+
+    expected = sorted(range(len(cells)), key=lambda index: (rows[index], cols[index]))
+    assert np.argsort(numbering["numbers"]).tolist() == expected
+
+
+def test_strings_break_at_gaps_and_height_changes():
+    numbering = number_panels(CELLS)
+
+    # (row, first_column, last_column, panels, first_number, last_number): A1:D1 is one string, F1:G1 follows
+    # a gap, H1:H2 touches it but is two rows high, A3:B3 is on the next row
+    assert numbering["strings"].tolist() == [[1, 1, 4, 2, 1, 2], [1, 6, 7, 1, 3, 3], [1, 8, 8, 1, 4, 4], [3, 1, 2, 1, 5, 5]]
+    assert numbering["rows"].tolist() == [[1, 4, 3], [3, 1, 1]]
+
+
+def test_summary_tables():
+    numbering = number_panels(CELLS)
+
+    assert string_table(numbering) == [
+        STRING_HEADER,
+        [1, 1, "A", "D", 2, 1, 2],
+        [2, 1, "F", "G", 1, 3, 3],
+        [3, 1, "H", "H", 1, 4, 4],
+        [4, 3, "A", "B", 1, 5, 5],
+    ]
+    assert summary_table(numbering) == [SUMMARY_HEADER, [1, 4, 3], [3, 1, 1], ["Total", 5, 4]]
+
+
+def test_no_panels():
+    numbering = number_panels(np.empty((0, 4), dtype=np.int64))
+
+    assert string_table(numbering) == [STRING_HEADER]
+    assert summary_table(numbering) == [SUMMARY_HEADER, ["Total", 0, 0]]
@@ -0,0 +1,129 @@
+import ezdxf
+import numpy as np
+import pytest
+
+import functions
+
+
+
+#########################################################################################################################################################################################
+# Reader regression checks: every reader finds the same panels, including panels on the default layer "0"
+#########################################################################################################################################################################################
+
+PANELS = 5
+
+
+@pytest.fixture
+def layer_zero_drawing(tmp_path):
+    """
+    PANELS closed 4-vertex panels on layer "0" (the default layer) and one on another layer.
+    """
+    doc = ezdxf.new("R2010")
+    msp = doc.modelspace()
+    for col in range(PANELS):
+        x = col * 2400.0
+        msp.add_lwpolyline([(x, 0), (x + 2329.8, 0), (x + 2329.8, 1134), (x, 1134)], close=True)
+    msp.add_lwpolyline([(0, 5000), (2329.8, 5000), (2329.8, 6134), (0, 6134)], close=True,
+                       dxfattribs={"layer": "SOL-PV MODULES"})
+    file_path = tmp_path / "layer_zero.dxf"
+    doc.saveas(file_path)
+    return str(file_path)
+
+
+@pytest.mark.parametrize("reader", ["mmap", "blocks", "stream", "ezdxf"])
+def test_reader_keeps_layer_zero_panels(layer_zero_drawing, reader):
+    panels = functions.read_panels(layer_zero_drawing, reader)
+    assert len(panels["points"]) == PANELS + 1
+    assert list(panels["layer"]).count("0") == PANELS
+
+
+def test_parallel_reader_keeps_layer_zero_panels(layer_zero_drawing):
+    panels = functions.read_panels_parallel(layer_zero_drawing, workers=2, parallel=True)
+    expected = functions.read_panels(layer_zero_drawing, "stream")
+    assert np.array_equal(np.sort(panels["points"], axis=0), np.sort(expected["points"], axis=0))
+
+
+@pytest.mark.parametrize("reader", ["mmap", "blocks"])
+def test_layer_zero_allowlist(layer_zero_drawing, reader):
+    panels = functions.read_panels(layer_zero_drawing, reader, layers=["0"])
+    assert len(panels["points"]) == PANELS
+
+
+INVALID_DRAWINGS = [b"", b"this is not a drawing\n" * 100]
+
+
+@pytest.mark.parametrize("content", INVALID_DRAWINGS)
+@pytest.mark.parametrize("reader", ["mmap", "blocks", "stream", "ezdxf"])
+def test_invalid_drawing_raises(tmp_path, content, reader):
+    file_path = tmp_path / "invalid.dxf"
+    file_path.write_bytes(content)
+    with pytest.raises(ValueError):
+        functions.read_panels(str(file_path), reader)
+
+
+@pytest.mark.parametrize("content", INVALID_DRAWINGS)
+def test_invalid_drawing_raises_in_parallel(tmp_path, content):
+    file_path = tmp_path / "invalid.dxf"
+    file_path.write_bytes(content)
+    with pytest.raises(ValueError):
+        functions.read_panels_parallel(str(file_path), workers=2, parallel=True)
+
+
+@pytest.mark.parametrize("pipeline", ["dict", "array"])
+def test_invalid_drawing_fails_conversion(tmp_path, pipeline):
+    # The stream reader is master_function's default, a conversion must fail instead of writing an empty workbook
+    file_path = tmp_path / "invalid.dxf"
+    file_path.write_bytes(INVALID_DRAWINGS[1])
+    with pytest.raises(ValueError):
+        functions.master_function(str(file_path), (0, 0), 100, 100, pipeline=pipeline)
+
+
+@pytest.mark.parametrize("reader", ["mmap", "blocks", "stream", "ezdxf"])
+def test_missing_drawing_raises(tmp_path, reader):
+    with pytest.raises(OSError):
+        functions.read_panels(str(tmp_path / "missing.dxf"), reader)
+
+
+@pytest.fixture
+def block_drawing(tmp_path):
+    """
+    Panels placed with rotated, scaled, nested and mirrored (extrusion (0, 0, -1)) INSERTs and a MINSERT array.
+    """
+    doc = ezdxf.new("R2010")
+    panel = doc.blocks.new("PANEL", base_point=(100, 50))
+    panel.add_lwpolyline([(0, 0), (2329.8, 0), (2329.8, 1134), (0, 1134)], close=True)
+
+    row = doc.blocks.new("ROW", base_point=(-500, 200))
+    row.add_lwpolyline([(0, 3000), (2329.8, 3000), (2329.8, 4134), (0, 4134)], close=True)
+    row.add_blockref("PANEL", (0, 0))
+    row.add_blockref("PANEL", (5000, 0), dxfattribs={"rotation": 90})
+    row.add_blockref("PANEL", (10000, 0), dxfattribs={"xscale": 1.5, "yscale": 0.5})
+
+    msp = doc.modelspace()
+    msp.add_blockref("PANEL", (1000, 2000), dxfattribs={"rotation": 30, "xscale": 2, "yscale": 0.5})
+    msp.add_blockref("ROW", (20000, 10000), dxfattribs={"rotation": 15})
+    msp.add_blockref("PANEL", (-40000, 5000), dxfattribs={"rotation": 10}).grid(size=(2, 3), spacing=(1200, 2400))
+    msp.add_blockref("PANEL", (7000, -3000), dxfattribs={"rotation": 20, "extrusion": (0, 0, -1)})
+    file_path = tmp_path / "blocks.dxf"
+    doc.saveas(file_path)
+    return str(file_path)
+
+
+def _virtual_panels(entity):
+    """
+    World vertices of the panels an entity places, exploded by ezdxf (MINSERT copies and nested blocks included).
+    """
+    if entity.dxftype() != "INSERT":
+        yield [tuple(vertex)[:2] for vertex in entity.vertices_in_wcs()]
+        return
+    for insert in entity.multi_insert():
+        for child in insert.virtual_entities():
+            yield from _virtual_panels(child)
+
+
+def test_blocks_reader_matches_ezdxf_virtual_entities(block_drawing):
+    expected = [panel for entity in ezdxf.readfile(block_drawing).modelspace() for panel in _virtual_panels(entity)]
+    panels = functions.read_panels(block_drawing, "blocks")
+
+    assert len(panels["points"]) == len(expected) == 1 + 4 + 6 + 1
+    assert sorted(np.round(panels["points"], 6).tolist()) == sorted(np.round(np.array(expected), 6).tolist())
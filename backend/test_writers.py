@@ -0,0 +1,46 @@
+import os
+
+import pytest
+from openpyxl import load_workbook
+
+import functions
+
+
+
+#########################################################################################################################################################################################
+# Writer regression checks: the streaming xml writer produces the same workbook as the openpyxl writer
+#########################################################################################################################################################################################
+
+SAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+# Drawing1 is left out, building it with openpyxl alone takes most of a minute
+DRAWINGS = ["Drawing2.dxf", "Drawing4.dxf"]
+
+
+def workbook_contents(excel_io):
+    """
+    Sheet name -> (values and styles of every written cell, merged ranges), as read back by openpyxl.
+    """
+    contents = {}
+    for ws in load_workbook(excel_io).worksheets:
+        cells = {}
+        for row in ws.iter_rows():
+            for cell in row:
+                if cell.value is not None or cell.fill.fill_type:
+                    cells[cell.coordinate] = (cell.value, cell.fill.fill_type, cell.fill.fgColor.rgb,
+                                              cell.alignment.horizontal, cell.alignment.vertical,
+                                              cell.border.left.style, cell.border.top.style)
+        contents[ws.title] = (cells, sorted(str(merged) for merged in ws.merged_cells.ranges))
+    return contents
+
+
+@pytest.mark.parametrize("drawing", DRAWINGS)
+def test_xml_writer_matches_openpyxl(drawing):
+    file_path = os.path.join(SAMPLES, drawing)
+    expected = workbook_contents(functions.master_function(file_path, (0, 0), 10000, 10000, reader="mmap", writer="openpyxl"))
+    written = workbook_contents(functions.master_function(file_path, (0, 0), 10000, 10000, reader="mmap", writer="xml"))
+
+    assert list(written) == list(expected)
+    for title in expected:
+        assert written[title][1] == expected[title][1], title
+        assert written[title][0] == expected[title][0], title
@@ -0,0 +1,69 @@
+import contextlib
+import io
+import logging
+import os
+import time
+
+import ezdxf
+
+import functions
+from instrumentation import logger
+
+
+
+#########################################################################################################################################################################################
+# Warm-up: runs a tiny conversion in every worker process before it takes real jobs
+#########################################################################################################################################################################################
+
+# The warm-up drawing: one table of landscape and one of portrait panels, so both orientations are mapped
+WARMUP_PANELS = 10
+WARMUP_PANEL_LONG = 2329.8
+WARMUP_PANEL_SHORT = 1134.0
+WARMUP_PANEL_GAP = 25.0
+
+# Readers the warm-up drawing is read with (every writer is run once with the first one)
+WARMUP_READERS = ("mmap", "blocks")
+
+
+def write_warmup_drawing(file_path):
+    """
+    Writes the warm-up drawing to file_path, unless it already exists.
+    """
+    if os.path.exists(file_path):
+        return file_path
+
+    doc = ezdxf.new("R2010")
+    msp = doc.modelspace()
+    for table, (width, height) in enumerate(((WARMUP_PANEL_LONG, WARMUP_PANEL_SHORT), (WARMUP_PANEL_SHORT, WARMUP_PANEL_LONG))):
+        y = table * 2 * (WARMUP_PANEL_LONG + WARMUP_PANEL_GAP)
+        for col in range(WARMUP_PANELS):
+            x = col * (width + WARMUP_PANEL_GAP)
+            msp.add_lwpolyline([(x, y), (x + width, y), (x + width, y + height), (x, y + height)], close=True)
+
+    # Write to a temporary name first, so a concurrent reader never sees a partial drawing
+    temporary_path = f"{file_path}.{os.getpid()}.tmp"
+    doc.saveas(temporary_path)
+    os.replace(temporary_path, file_path)
+    return file_path
+
+
+def warm_up_worker(drawing_path):
+    """
+    Pool initializer: converts the warm-up drawing with every reader in WARMUP_READERS and every writer
+    (output discarded), so lazy imports, compiled regexes and the first-call paths of NumPy and openpyxl
+    are loaded before the worker takes its first job. Modules imported by the app (and the column label
+    table it builds) are already in the worker, which is forked from the app process.
+    """
+    start = time.perf_counter()
+    write_warmup_drawing(drawing_path)
+    runs = [(reader, "xml") for reader in WARMUP_READERS[1:]] + [(WARMUP_READERS[0], writer) for writer in functions.EXCEL_WRITERS]
+    # The messages of the warm-up conversions themselves are of no interest
+    level = logger.level
+    logger.setLevel(logging.WARNING)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for reader, writer in runs:
+                functions.master_function(drawing_path, (0, 0), 100, 100, reader=reader, writer=writer)
+    finally:
+        logger.setLevel(level)
+    logger.info(f"Worker {os.getpid()} warmed up in {time.perf_counter() - start:.2f} s")
@@ -0,0 +1,211 @@
+import zipfile
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from addressing import column_labels, range_references
+from panel_numbering import number_panels, string_table, summary_table, SUMMARY_SHEET, STRINGS_SHEET
+
+
+
+#########################################################################################################################################################################################
+# Fast-path xlsx writer: streams the sheet XML directly instead of building openpyxl cell objects
+#########################################################################################################################################################################################
+
+# Style ids registered in STYLES_XML (cellXfs): 0 = default, 1 = blue fill + thin border + centered, 2 = thin border
+# 1 and 2 are based on the named styles "Panel" and "Panel border", like in write_grid_cells_to_excel
+STYLE_DEFAULT = 0
+STYLE_PANEL = 1
+STYLE_BORDER = 2
+
+# Same sheet layout as write_grid_cells_to_excel: default row height, column width for the occupied columns
+COLUMN_WIDTH = 3
+ROW_HEIGHT = 14.5
+
+CONTENT_TYPES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet2.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet3.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+
+ROOT_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+WORKBOOK_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Grid Cells" sheetId="1" r:id="rId1"/>'
+    f'<sheet name="{STRINGS_SHEET}" sheetId="2" r:id="rId2"/>'
+    f'<sheet name="{SUMMARY_SHEET}" sheetId="3" r:id="rId3"/></sheets>'
+    '</workbook>'
+)
+
+WORKBOOK_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet2.xml"/>'
+    '<Relationship Id="rId3" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet3.xml"/>'
+    '<Relationship Id="rId4" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+STYLES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/><family val="2"/></font></fonts>'
+    '<fills count="3">'
+    '<fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill>'
+    '<fill><patternFill patternType="solid"><fgColor rgb="00ADD8E6"/><bgColor rgb="00ADD8E6"/></patternFill></fill>'
+    '</fills>'
+    '<borders count="2">'
+    '<border><left/><right/><top/><bottom/><diagonal/></border>'
+    '<border><left style="thin"/><right style="thin"/><top style="thin"/><bottom style="thin"/><diagonal/></border>'
+    '</borders>'
+    '<cellStyleXfs count="3">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0"/>'
+    '<xf numFmtId="0" fontId="0" fillId="2" borderId="1" applyFill="1" applyBorder="1" applyAlignment="1">'
+    '<alignment horizontal="center" vertical="center" shrinkToFit="1"/></xf>'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="1" applyBorder="1"/>'
+    '</cellStyleXfs>'
+    '<cellXfs count="3">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="0" fillId="2" borderId="1" xfId="1" applyFill="1" applyBorder="1" applyAlignment="1">'
+    '<alignment horizontal="center" vertical="center" shrinkToFit="1"/></xf>'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="1" xfId="2" applyBorder="1"/>'
+    '</cellXfs>'
+    '<cellStyles count="3">'
+    '<cellStyle name="Normal" xfId="0" builtinId="0"/>'
+    '<cellStyle name="Panel" xfId="1"/>'
+    '<cellStyle name="Panel border" xfId="2"/>'
+    '</cellStyles>'
+    '</styleSheet>'
+)
+
+
+def write_grid_cells_to_xlsx(grid_cells, output=None):
+    """
+    Writes the cells of every panel as a merged, filled and bordered range holding the panel number, plus the
+    strings and summary sheets, like write_grid_cells_to_excel, but streams the worksheet XML into the zip
+    instead of creating a cell object per styled cell.
+
+    :param grid_cells: (M, 4) array or iterable of 0-based (row, col, adjacent_row, adjacent_col)
+    :param output: Optional file path or binary file object to stream the workbook to instead of memory
+    :return: BytesIO object holding the workbook, or output if it was given
+    """
+    styles = {}  # (row, col) -> style id, 1-based like Excel
+    values = {}  # (row, col) -> panel number of the merged cell
+    numbering = number_panels(grid_cells)
+    ranges = numbering["ranges"]
+    merges = range_references(ranges)
+
+    for (start_row, start_col, end_row, end_col), number in zip(ranges.tolist(), numbering["numbers"].tolist()):
+        # Border on the edge of the merged range (interior cells are hidden by the merge), fill and
+        # alignment on the top-left cell
+        for row in range(start_row, end_row + 1):
+            for col in (range(start_col, end_col + 1) if row in (start_row, end_row) else {start_col, end_col}):
+                styles.setdefault((row, col), STYLE_BORDER)
+        styles[(start_row, start_col)] = STYLE_PANEL
+        values[(start_row, start_col)] = number
+
+    excel_io = BytesIO() if output is None else output
+    with zipfile.ZipFile(excel_io, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", CONTENT_TYPES_XML)
+        zf.writestr("_rels/.rels", ROOT_RELS_XML)
+        zf.writestr("xl/workbook.xml", WORKBOOK_XML)
+        zf.writestr("xl/_rels/workbook.xml.rels", WORKBOOK_RELS_XML)
+        zf.writestr("xl/styles.xml", STYLES_XML)
+        with zf.open("xl/worksheets/sheet1.xml", "w") as sheet:
+            _write_sheet_xml(sheet, styles, values, merges)
+        with zf.open("xl/worksheets/sheet2.xml", "w") as sheet:
+            _write_table_xml(sheet, string_table(numbering))
+        with zf.open("xl/worksheets/sheet3.xml", "w") as sheet:
+            _write_table_xml(sheet, summary_table(numbering))
+
+    if output is None:
+        excel_io.seek(0)
+    return excel_io
+
+
+def _write_sheet_xml(sheet, styles, values, merges):
+    """
+    Streams the worksheet XML row by row; rows and cells have to be written in ascending order.
+    """
+    def write(text):
+        sheet.write(text.encode("utf-8"))
+
+    write('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+          '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">')
+    if styles:
+        max_row = max(row for row, _ in styles)
+        max_col = max(col for _, col in styles)
+        labels = column_labels(max_col)
+        write(f'<dimension ref="A1:{labels[max_col - 1]}{max_row}"/>')
+    write(f'<sheetFormatPr defaultRowHeight="{ROW_HEIGHT}" customHeight="1"/>')
+    if styles:
+        write(f'<cols><col min="1" max="{max_col}" width="{COLUMN_WIDTH}" customWidth="1"/></cols>')
+
+    write('<sheetData>')
+    current_row = None
+    buffer = []
+    for row, col in sorted(styles):
+        if row != current_row:
+            if current_row is not None:
+                buffer.append('</row>')
+            buffer.append(f'<row r="{row}">')
+            current_row = row
+        value = values.get((row, col))
+        if value is None:
+            buffer.append(f'<c r="{labels[col - 1]}{row}" s="{styles[(row, col)]}"/>')
+        else:
+            buffer.append(f'<c r="{labels[col - 1]}{row}" s="{styles[(row, col)]}"><v>{value}</v></c>')
+        if len(buffer) >= 4096:
+            write("".join(buffer))
+            buffer = []
+    if current_row is not None:
+        buffer.append('</row>')
+    write("".join(buffer))
+    write('</sheetData>')
+
+    if merges:
+        write(f'<mergeCells count="{len(merges)}">')
+        for start in range(0, len(merges), 4096):
+            write("".join(f'<mergeCell ref="{ref}"/>' for ref in merges[start:start + 4096]))
+        write('</mergeCells>')
+
+    write('<pageMargins left="0.75" right="0.75" top="1" bottom="1" header="0.5" footer="0.5"/>')
+    write('</worksheet>')
+
+
+def _write_table_xml(sheet, table):
+    """
+    Streams a worksheet with one row per item of table (lists of numbers and strings, strings written inline).
+    """
+    labels = column_labels(max((len(row) for row in table), default=0))
+    buffer = ['<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+              '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>']
+    for row_number, row in enumerate(table, start=1):
+        buffer.append(f'<row r="{row_number}">')
+        for col, value in enumerate(row):
+            if isinstance(value, str):
+                buffer.append(f'<c r="{labels[col]}{row_number}" t="inlineStr"><is><t>{escape(value)}</t></is></c>')
+            else:
+                buffer.append(f'<c r="{labels[col]}{row_number}"><v>{value}</v></c>')
+        buffer.append('</row>')
+        if len(buffer) >= 4096:
+            sheet.write("".join(buffer).encode("utf-8"))
+            buffer = []
+    buffer.append('</sheetData><pageMargins left="0.75" right="0.75" top="1" bottom="1" header="0.5" footer="0.5"/></worksheet>')
+    sheet.write("".join(buffer).encode("utf-8"))
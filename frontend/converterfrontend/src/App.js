@@ -2,16 +2,69 @@ import React, { useState } from 'react';
 import axios from 'axios';
 //import './FileDropZone.css'; // Create this CSS file for styling
 
+const API_URL = 'http://localhost:5001';
+
+// Drawings larger than this are sent in chunks through the resumable /uploads routes
+const CHUNKED_UPLOAD_THRESHOLD = 16 * 1024 * 1024;
+const CHUNK_RETRIES = 3;
+
+// Preview tiles are shown PREVIEW_PAGE_TILES x PREVIEW_PAGE_TILES at a time, each cell drawn PREVIEW_SCALE pixels wide
+const PREVIEW_PAGE_TILES = 4;
+const PREVIEW_SCALE = 2;
+
+// Uploads the file chunk by chunk; a failed chunk is retried from the offset the server reports
+// completeBody is sent when completing the upload, e.g. { preview: true } to queue a preview instead of a conversion
+async function uploadInChunks(file, completeBody = {}) {
+  const start = await axios.post(`${API_URL}/uploads`, { filename: file.name, size: file.size });
+  const { upload_id: uploadId, chunk_bytes: chunkBytes } = start.data;
+
+  let offset = 0;
+  let retries = 0;
+  while (offset < file.size) {
+    try {
+      const chunk = await axios.put(`${API_URL}/uploads/${uploadId}`, file.slice(offset, offset + chunkBytes), {
+        headers: { 'Content-Type': 'application/octet-stream', 'Upload-Offset': offset },
+      });
+      offset = chunk.data.offset;
+      retries = 0;
+    } catch (error) {
+      if (++retries > CHUNK_RETRIES) {
+        throw error;
+      }
+      const status = await axios.get(`${API_URL}/uploads/${uploadId}`);
+      offset = status.data.offset;
+    }
+  }
+
+  return axios.post(`${API_URL}/uploads/${uploadId}/complete`, completeBody);
+}
+
+// Polls a job until it is done, throws with the job's error if it failed
+async function waitForJob(jobId, status) {
+  while (status !== 'done') {
+    await new Promise((resolve) => setTimeout(resolve, status === 'queued' ? 1000 : 250));
+    const job = await axios.get(`${API_URL}/jobs/${jobId}`);
+    status = job.data.status;
+    if (status === 'failed') {
+      throw new Error(job.data.error);
+    }
+  }
+}
+
 function FileUpload() {
   const [file, setFile] = useState(null);
   const [lwpolylines, setLwpolylines] = useState([]);
   const [fileName, setFileName] = useState("");
+  const [preview, setPreview] = useState(null);
+  const [zoom, setZoom] = useState(0);
+  const [page, setPage] = useState({ row: 0, column: 0 });
 
   const handleFileChange = (event) => {
     const selectedFile = event.target.files[0];
     if (selectedFile) {
       setFile(selectedFile);
       setFileName(selectedFile.name); // Display the file name after selection
+      setPreview(null);
     }
   };
 
@@ -23,15 +76,27 @@ function FileUpload() {
       return;
     }
 
-    const formData = new FormData();
-    formData.append('file', file);
-
     try {
         // Change cursor to loading
       document.body.style.cursor = "wait";
 
-      const response = await axios.post('http://localhost:5001/upload', formData, {
-        headers: { 'Content-Type': 'multipart/form-data' },
+      // The upload returns a job id, the conversion runs in the background
+      let upload;
+      if (file.size > CHUNKED_UPLOAD_THRESHOLD) {
+        upload = await uploadInChunks(file);
+      } else {
+        const formData = new FormData();
+        formData.append('file', file);
+        upload = await axios.post(`${API_URL}/upload`, formData, {
+          headers: { 'Content-Type': 'multipart/form-data' },
+        });
+      }
+      const jobId = upload.data.job_id;
+
+      // Poll the job until the workbook is ready
+      await waitForJob(jobId, upload.data.status);
+
+      const response = await axios.get(`${API_URL}/jobs/${jobId}/result`, {
         responseType: 'blob', // Important: set responseType to 'blob' to handle binary data
       });
     
@@ -63,6 +128,95 @@ function FileUpload() {
   }
   };
 
+  // Maps the panels without building the workbook and shows the occupied cells as tiles
+  const handlePreview = async () => {
+    if (!file) {
+      alert('Please select a file to preview');
+      return;
+    }
+
+    try {
+      document.body.style.cursor = "wait";
+
+      let upload;
+      if (file.size > CHUNKED_UPLOAD_THRESHOLD) {
+        upload = await uploadInChunks(file, { preview: true });
+      } else {
+        const formData = new FormData();
+        formData.append('file', file);
+        upload = await axios.post(`${API_URL}/preview`, formData, {
+          headers: { 'Content-Type': 'multipart/form-data' },
+        });
+      }
+      const jobId = upload.data.job_id;
+      await waitForJob(jobId, upload.data.status);
+
+      const response = await axios.get(`${API_URL}/previews/${jobId}`);
+      setPreview(response.data);
+      setZoom(0);
+      setPage({ row: 0, column: 0 });
+    } catch (error) {
+      console.error('Error previewing file:', error);
+    } finally {
+      document.body.style.cursor = "default";
+    }
+  };
+
+  // Switches the zoom level, keeping the top-left tile of the page in view
+  const changeZoom = (newZoom) => {
+    const factor = 2 ** (newZoom - zoom);
+    const level = preview.levels[newZoom];
+    setPage({
+      row: Math.min(Math.floor(page.row * factor), Math.max(level.tile_rows - PREVIEW_PAGE_TILES, 0)),
+      column: Math.min(Math.floor(page.column * factor), Math.max(level.tile_columns - PREVIEW_PAGE_TILES, 0)),
+    });
+    setZoom(newZoom);
+  };
+
+  const renderPreview = () => {
+    const level = preview.levels[zoom];
+    const stats = preview.stats;
+    const tileRows = [];
+    for (let row = page.row; row < Math.min(page.row + PREVIEW_PAGE_TILES, level.tile_rows); row++) {
+      const tiles = [];
+      for (let column = page.column; column < Math.min(page.column + PREVIEW_PAGE_TILES, level.tile_columns); column++) {
+        const width = Math.min(preview.tile_cells, level.columns - column * preview.tile_cells);
+        tiles.push(
+          <img
+            key={column}
+            alt=""
+            src={`${API_URL}/previews/${preview.job_id}/tiles/${zoom}/${row}/${column}`}
+            style={{ width: width * PREVIEW_SCALE, imageRendering: 'pixelated', display: 'block' }}
+          />
+        );
+      }
+      tileRows.push(<div key={row} className="flex">{tiles}</div>);
+    }
+
+    const pan = (rows, columns) => setPage({
+      row: Math.min(Math.max(page.row + rows, 0), Math.max(level.tile_rows - PREVIEW_PAGE_TILES, 0)),
+      column: Math.min(Math.max(page.column + columns, 0), Math.max(level.tile_columns - PREVIEW_PAGE_TILES, 0)),
+    });
+
+    return (
+      <div className="flex flex-col items-center mt-4">
+        <p>
+          Cell size {stats.cell_size.toFixed(1)} (confidence {(stats.confidence * 100).toFixed(0)}%),
+          {' '}{stats.mapped} of {stats.panels} panels mapped to {stats.rows} rows x {stats.columns} columns
+        </p>
+        <div className="flex gap-2 my-2">
+          <button type="button" disabled={zoom === 0} onClick={() => changeZoom(zoom - 1)}>Zoom out</button>
+          <button type="button" disabled={zoom === preview.levels.length - 1} onClick={() => changeZoom(zoom + 1)}>Zoom in</button>
+          <button type="button" onClick={() => pan(0, -PREVIEW_PAGE_TILES)}>Left</button>
+          <button type="button" onClick={() => pan(0, PREVIEW_PAGE_TILES)}>Right</button>
+          <button type="button" onClick={() => pan(-PREVIEW_PAGE_TILES, 0)}>Up</button>
+          <button type="button" onClick={() => pan(PREVIEW_PAGE_TILES, 0)}>Down</button>
+        </div>
+        <div style={{ border: '1px solid #ccc' }}>{tileRows}</div>
+      </div>
+    );
+  };
+
   // Function to simulate clicking the hidden file input when the button is clicked
   const triggerFileInput = () => {
     const fileInput = document.getElementById('file-input');
@@ -106,10 +260,21 @@ return (
         >
           Upload DXF
         </button>
+
+        {/* Preview button: shows the grid mapping without building the workbook */}
+        <button 
+          type="button" 
+          onClick={handlePreview}
+          className="bg-gray-500 text-white py-2 px-4 rounded"
+        >
+          Preview
+        </button>
       </div>
     </form>
 
     {fileName && <p>Selected File: {fileName}</p>} {/* Display selected file name */}
+
+    {preview && renderPreview()}
     
     {lwpolylines.length > 0 && (
       <div>